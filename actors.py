@@ -0,0 +1,148 @@
+import asyncio
+import logging
+import time
+from typing import Awaitable, Callable, Dict, Optional
+
+from config import ACTOR_IDLE, ACTOR_MAILBOX
+from tenancy import BOT_NS
+
+# Игры чата живут в акторе: одна задача на чат разбирает ограниченный
+# ящик — нажатия кнопок, команды игр и тики таймеров — строго по одному.
+# Состояние игры меняется только внутри актора, без замков, а хендлер
+# апдейта лишь кладёт работу в ящик и сразу отпускает чат: слоты и команды
+# того же чата не ждут, пока стол договорит с Telegram. Актор без дела
+# дольше ACTOR_IDLE снимается; сама игра лежит в bot_data["games"], так
+# что следующее сообщение просто поднимет новый.
+
+Job = Callable[[], Awaitable]
+
+BUSY_TEXT = "⏳ Стол не успевает, нажмите ещё раз"
+
+
+class _Actor:
+    __slots__ = ("chat_id", "mailbox", "task", "busy", "last")
+
+    def __init__(self, chat_id: int, size: int):
+        self.chat_id = chat_id
+        self.mailbox: asyncio.Queue = asyncio.Queue(size)
+        self.task: Optional[asyncio.Task] = None
+        self.busy = False
+        self.last = time.monotonic()
+
+
+class Actors:
+    def __init__(self, app, mailbox: int = ACTOR_MAILBOX, idle: float = ACTOR_IDLE):
+        self.app = app
+        self.ns = getattr(app.update_processor, "ns", "")
+        self.size = mailbox
+        self.idle = idle
+        self._actors: Dict[int, _Actor] = {}
+        self._reaper: Optional[asyncio.TimerHandle] = None
+        self._closed = False
+
+    def tell(self, chat_id: int, job: Job) -> bool:
+        # False — ящик полон, работа не принята
+        if self._closed:
+            return True
+        try:
+            self._actor(chat_id).mailbox.put_nowait(job)
+        except asyncio.QueueFull:
+            return False
+        return True
+
+    async def send(self, chat_id: int, job: Job) -> None:
+        # для тиков таймеров: ждём места, но не теряем
+        if not self._closed:
+            await self._actor(chat_id).mailbox.put(job)
+
+    async def deliver(self, update, job: Job) -> None:
+        # из хендлера: полный ящик — отказ нажатию, а не очередь без дна
+        if self.tell(update.effective_chat.id, job):
+            return
+        print(f"Актор чата {update.effective_chat.id}: ящик полон, апдейт отброшен")
+        if update.callback_query is not None:
+            await update.callback_query.answer(BUSY_TEXT)
+
+    def _actor(self, chat_id: int) -> _Actor:
+        actor = self._actors.get(chat_id)
+        if actor is None:
+            actor = self._actors[chat_id] = _Actor(chat_id, self.size)
+            actor.task = asyncio.create_task(self._loop(actor))
+            if self._reaper is None:
+                self._arm()
+        return actor
+
+    async def _loop(self, actor: _Actor) -> None:
+        BOT_NS.set(self.ns)
+        mailbox = actor.mailbox
+        while True:
+            job = await mailbox.get()
+            actor.busy = True
+            try:
+                await job()
+            except Exception:
+                logging.exception("Актор чата %s: ошибка", actor.chat_id)
+            finally:
+                actor.busy = False
+                actor.last = time.monotonic()
+
+    def _arm(self) -> None:
+        loop = asyncio.get_running_loop()
+        self._reaper = loop.call_later(self.idle / 2, self._reap)
+
+    def _reap(self) -> None:
+        # ждущий на пустом ящике актор отменяется без потери работы
+        self._reaper = None
+        deadline = time.monotonic() - self.idle
+        idle = [
+            a
+            for a in self._actors.values()
+            if not a.busy and a.mailbox.empty() and a.last < deadline
+        ]
+        for actor in idle:
+            actor.task.cancel()
+            del self._actors[actor.chat_id]
+        if self._actors:
+            self._arm()
+
+    def __len__(self) -> int:
+        return len(self._actors)
+
+    async def stop(self) -> None:
+        self._closed = True
+        if self._reaper is not None:
+            self._reaper.cancel()
+            self._reaper = None
+        tasks = [a.task for a in self._actors.values()]
+        self._actors.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def game_handler(game_type, method: str):
+    # колбэк PTB: апдейт уходит в ящик актора чата, а там вызывается метод
+    # игры, если в чате сейчас идёт именно game_type
+    async def callback(update, context) -> None:
+        chat_id = update.effective_chat.id
+
+        async def job():
+            game = context.application.bot_data["games"].get(chat_id)
+            if isinstance(game, game_type):
+                await getattr(game, method)(update, context)
+            elif update.callback_query is not None:
+                await update.callback_query.answer("Игра уже завершена")
+
+        await context.application.bot_data["actors"].deliver(update, job)
+
+    return callback
+
+
+def game_command(start: Callable):
+    # команда запуска игры — тоже через актор, в очередь с нажатиями
+    async def callback(update, context) -> None:
+        await context.application.bot_data["actors"].deliver(
+            update, lambda: start(update, context)
+        )
+
+    return callback
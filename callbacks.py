@@ -0,0 +1,62 @@
+import time
+from typing import Dict, Tuple
+
+from telegram.ext import ContextTypes
+
+import outbox
+from tenancy import BOT_NS
+
+# Общий конвейер для инлайн-кнопок: дешёвая проверка в памяти, сразу
+# answer() (у игрока пропадает «часики»), потом работа с БД и правка стола.
+# Ошибки, выяснившиеся уже после ответа, приходят отдельным сообщением.
+
+DOUBLE_TAP_WINDOW = 1.0
+# кнопки, быстрое повторное нажатие которых — настоящий ход, а не дубль
+REPEATABLE = {"bj_act_hit"}
+FOLLOW_UP_TTL = 7
+
+
+class TapFilter:
+    def __init__(self, window: float = DOUBLE_TAP_WINDOW):
+        self.window = window
+        self._seen: Dict[Tuple[str, int, int, str], float] = {}
+
+    def is_repeat(self, query) -> bool:
+        if query.data in REPEATABLE:
+            return False
+        now = time.monotonic()
+        if len(self._seen) > 1000:
+            self._seen = {k: t for k, t in self._seen.items() if now - t < self.window}
+        key = (
+            BOT_NS.get(),
+            query.message.chat.id if query.message else 0,
+            query.from_user.id,
+            query.data,
+        )
+        last = self._seen.get(key)
+        self._seen[key] = now
+        return last is not None and now - last < self.window
+
+
+TAPS = TapFilter()
+
+
+async def early_ack(query, text: str = None) -> None:
+    # повторные нажатия той же кнопки отсекает shedding.LoadShedder ещё на входе
+    await query.answer(text)
+
+
+def follow_up(context: ContextTypes.DEFAULT_TYPE, chat_id: int, user, text: str):
+    def schedule_removal(msg):
+        context.job_queue.run_once(
+            _remove_follow_up, when=FOLLOW_UP_TTL, data=(chat_id, msg.message_id)
+        )
+
+    context.application.bot_data["outbox"].put(
+        outbox.send(chat_id, f"⚠️ {user.first_name}: {text}", on_sent=schedule_removal)
+    )
+
+
+async def _remove_follow_up(context: ContextTypes.DEFAULT_TYPE):
+    chat_id, message_id = context.job.data
+    context.application.bot_data["outbox"].put(outbox.remove(chat_id, message_id))
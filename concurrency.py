@@ -0,0 +1,65 @@
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Awaitable, Dict
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+from config import MAX_CONCURRENT_UPDATES
+from tenancy import BOT_NS
+
+# Апдейты разных чатов обрабатываются параллельно, а внутри одного чата —
+# строго по очереди: у каждого чата свой замок. Игры в него не упираются:
+# их апдейты и таймеры сериализует актор чата (actors.py), хендлер только
+# кладёт работу в ящик.
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    def __init__(
+        self, max_concurrent_updates: int = MAX_CONCURRENT_UPDATES, ns: str = ""
+    ):
+        super().__init__(max_concurrent_updates)
+        self.ns = ns
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._waiters: Dict[int, int] = {}
+        self.backlog = 0
+
+    @asynccontextmanager
+    async def chat_lock(self, chat_id: int):
+        lock = self._locks.get(chat_id)
+        if lock is None:
+            lock = self._locks[chat_id] = asyncio.Lock()
+        self._waiters[chat_id] = self._waiters.get(chat_id, 0) + 1
+        self.backlog += 1
+        try:
+            async with lock:
+                yield
+        finally:
+            self.backlog -= 1
+            left = self._waiters[chat_id] - 1
+            if left:
+                self._waiters[chat_id] = left
+            else:
+                del self._waiters[chat_id]
+                del self._locks[chat_id]
+
+    async def process_update(self, update: object, coroutine: Awaitable) -> None:
+        # каждый апдейт — своя задача, так что пространство имён бота не
+        # протекает в чужие
+        BOT_NS.set(self.ns)
+        chat = update.effective_chat if isinstance(update, Update) else None
+        if chat is None:
+            return await super().process_update(update, coroutine)
+        # замок берём до семафора: апдейты, ждущие свой чат, не занимают
+        # слоты конкурентности у остальных чатов
+        async with self.chat_lock(chat.id):
+            await super().process_update(update, coroutine)
+
+    async def do_process_update(self, update: object, coroutine: Awaitable) -> None:
+        await coroutine
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
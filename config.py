@@ -4,8 +4,65 @@ import os
 START_BALANCE: int = int(os.getenv("START_BALANCE", "100000"))
 JACKPOT_START: int = int(os.getenv("JACKPOT_START", "0"))
 DB_URL: str = os.getenv("DB_URL", "sqlite:///data.db")
+DB_BUSY_TIMEOUT: int = int(os.getenv("DB_BUSY_TIMEOUT", "5000"))  # мс
 TOKEN: str = os.getenv("BOT_TOKEN")
+EXTRA_BOT_TOKENS: list[str] = [
+    t.strip() for t in os.getenv("EXTRA_BOT_TOKENS", "").split(",") if t.strip()
+]
 SPIN_COST: int = int(os.getenv("SPIN_COST", "2"))
 JACKPOT_INCREMENT: int = int(os.getenv("JACKPOT_INCREMENT", "1"))
 FREE_MONEY: int = int(os.getenv("FREE_MONEY", "50"))
 BJ_RESTART: int = int(os.getenv("BJ_RESTART", "7"))
+BJ_DECKS: int = int(os.getenv("BJ_DECKS", "1"))
+BJ_PENETRATION: float = float(os.getenv("BJ_PENETRATION", "0.75"))
+BJ_EDIT_INTERVAL: float = float(os.getenv("BJ_EDIT_INTERVAL", "2.0"))
+RECOVER_BATCH: int = int(os.getenv("RECOVER_BATCH", "500"))
+OUTBOX_WORKERS: int = int(os.getenv("OUTBOX_WORKERS", "4"))
+OUTBOX_RETRIES: int = int(os.getenv("OUTBOX_RETRIES", "3"))
+OUTBOX_PERSIST: bool = os.getenv("OUTBOX_PERSIST", "0") == "1"
+BOT_MODE: str = os.getenv("BOT_MODE", "polling")
+WEBHOOK_URL: str = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_LISTEN: str = os.getenv("WEBHOOK_LISTEN", "127.0.0.1")
+WEBHOOK_PORT: int = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_PATH: str = os.getenv("WEBHOOK_PATH", "/telegram")
+WEBHOOK_SECRET: str = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_MAX_CONNECTIONS: int = int(os.getenv("WEBHOOK_MAX_CONNECTIONS", "40"))
+WEBHOOK_CERT: str = os.getenv("WEBHOOK_CERT", "")
+WEBHOOK_KEY: str = os.getenv("WEBHOOK_KEY", "")
+MAX_CONCURRENT_UPDATES: int = int(os.getenv("MAX_CONCURRENT_UPDATES", "256"))
+ACTOR_MAILBOX: int = int(os.getenv("ACTOR_MAILBOX", "64"))
+ACTOR_IDLE: int = int(os.getenv("ACTOR_IDLE", "300"))
+BOT_WORKERS: int = int(os.getenv("BOT_WORKERS", "1"))
+BOT_POOL_SIZE: int = int(os.getenv("BOT_POOL_SIZE", "32"))
+BOT_KEEPALIVE: int = int(os.getenv("BOT_KEEPALIVE", "16"))
+BOT_KEEPALIVE_EXPIRY: float = float(os.getenv("BOT_KEEPALIVE_EXPIRY", "60"))
+BOT_POLL_POOL_SIZE: int = int(os.getenv("BOT_POLL_POOL_SIZE", "2"))
+BOT_HTTP_VERSION: str = os.getenv("BOT_HTTP_VERSION", "1.1")
+BOT_CONNECT_TIMEOUT: float = float(os.getenv("BOT_CONNECT_TIMEOUT", "5"))
+BOT_READ_TIMEOUT: float = float(os.getenv("BOT_READ_TIMEOUT", "10"))
+BOT_WRITE_TIMEOUT: float = float(os.getenv("BOT_WRITE_TIMEOUT", "10"))
+BOT_POOL_TIMEOUT: float = float(os.getenv("BOT_POOL_TIMEOUT", "5"))
+BOT_POLL_READ_TIMEOUT: float = float(os.getenv("BOT_POLL_READ_TIMEOUT", "40"))
+REQUEST_METRICS_INTERVAL: int = int(os.getenv("REQUEST_METRICS_INTERVAL", "300"))
+SHED_SPIN_AGE: int = int(os.getenv("SHED_SPIN_AGE", "30"))
+SHED_MESSAGE_AGE: int = int(os.getenv("SHED_MESSAGE_AGE", "120"))
+SHED_BACKLOG: int = int(os.getenv("SHED_BACKLOG", "200"))
+SHED_PRESSURE_FACTOR: float = float(os.getenv("SHED_PRESSURE_FACTOR", "0.25"))
+SHED_REPORT_INTERVAL: int = int(os.getenv("SHED_REPORT_INTERVAL", "60"))
+PERSIST_INTERVAL: int = int(os.getenv("PERSIST_INTERVAL", "60"))
+PERSIST_BATCH: int = int(os.getenv("PERSIST_BATCH", "500"))
+MEMORY_BUDGET_MB: float = float(os.getenv("MEMORY_BUDGET_MB", "64"))
+MEMORY_SWEEP_INTERVAL: int = int(os.getenv("MEMORY_SWEEP_INTERVAL", "300"))
+USER_DATA_TTL: int = int(os.getenv("USER_DATA_TTL", "21600"))
+CHAT_DATA_TTL: int = int(os.getenv("CHAT_DATA_TTL", "21600"))
+SESSION_RESULTS_LIMIT: int = int(os.getenv("SESSION_RESULTS_LIMIT", "200"))
+ITEMS_FILE: str = os.getenv("ITEMS_FILE", "items.json")
+ADMIN_IDS: set[int] = {
+    int(i) for i in os.getenv("ADMIN_IDS", "").split(",") if i.strip()
+}
+TRACE_LEVEL: str = os.getenv("TRACE_LEVEL", "info")
+TRACE_SAMPLE: float = float(os.getenv("TRACE_SAMPLE", "0.1"))
+TRACE_BUFFER: int = int(os.getenv("TRACE_BUFFER", "10000"))
+TRACE_FLUSH: float = float(os.getenv("TRACE_FLUSH", "1.0"))
+TRACE_FILE: str = os.getenv("TRACE_FILE", "")
+INLINE_CACHE_TIME: int = int(os.getenv("INLINE_CACHE_TIME", "86400"))
@@ -1,24 +1,69 @@
-from sqlalchemy import create_engine, select
-from sqlalchemy.orm import sessionmaker, scoped_session
-from models import Base, PlayerModel, RoomModel
-from config import START_BALANCE, JACKPOT_START, DB_URL
+from sqlalchemy import create_engine, event, inspect, select, text
+from sqlalchemy.orm import sessionmaker
+from models import Base, OutboxModel, PlayerModel, RoomModel
+from config import START_BALANCE, JACKPOT_START, DB_URL, DB_BUSY_TIMEOUT
+from tenancy import BOT_NS
 
 engine = create_engine(
     DB_URL,
     echo=False,
     future=True,
 )
-SessionLocal = scoped_session(sessionmaker(bind=engine, expire_on_commit=False))
+
+if engine.dialect.name == "sqlite":
+    # при BOT_WORKERS > 1 в один файл пишут несколько процессов: WAL не
+    # даёт читателям и писателю ждать друг друга, а занятую запись ждём
+    # DB_BUSY_TIMEOUT вместо немедленного «database is locked»
+
+    @event.listens_for(engine, "connect")
+    def _sqlite_pragmas(conn, _):
+        cur = conn.cursor()
+        cur.execute("PRAGMA journal_mode=WAL")
+        cur.execute(f"PRAGMA busy_timeout={DB_BUSY_TIMEOUT}")
+        cur.close()
+
+
+# без scoped_session: апдейты идут конкурентно в одном потоке, и общая
+# сессия на поток перемешала бы транзакции разных корутин
+SessionLocal = sessionmaker(bind=engine, expire_on_commit=False)
 Base.metadata.create_all(bind=engine)
 
 
+NS_TABLES = (PlayerModel.__table__, RoomModel.__table__, OutboxModel.__table__)
+
+
+def _migrate_bot_ns():
+    # базы до мультибота: колонки bot_ns нет, а chat_tg_id уникален сам по себе
+    insp = inspect(engine)
+    with engine.begin() as conn:
+        for table in NS_TABLES:
+            if "bot_ns" not in {c["name"] for c in insp.get_columns(table.name)}:
+                conn.execute(
+                    text(
+                        f"ALTER TABLE {table.name} "
+                        "ADD COLUMN bot_ns VARCHAR NOT NULL DEFAULT ''"
+                    )
+                )
+        for ix in insp.get_indexes(RoomModel.__tablename__):
+            if ix["name"] == "ix_room_chat_tg_id" and ix["unique"]:
+                conn.execute(text("DROP INDEX ix_room_chat_tg_id"))
+    for table in NS_TABLES:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
+
+
+_migrate_bot_ns()
+
+
 def change_balance_f(player: "PlayerModel", amount) -> None:
     player.balance += amount
 
 
 def change_balance(session, user_id, chat_id, amount):
     player = (
-        session.query(PlayerModel).filter_by(tg_id=user_id, room_id=chat_id).first()
+        session.query(PlayerModel)
+        .filter_by(tg_id=user_id, room_id=chat_id, bot_ns=BOT_NS.get())
+        .first()
     )
     if not player:
         raise ValueError(f"Player with tg id {user_id} does not exist")
@@ -27,7 +72,9 @@ def change_balance(session, user_id, chat_id, amount):
 
 def set_balance(session, user_id, chat_id, amount):
     player = (
-        session.query(PlayerModel).filter_by(tg_id=user_id, room_id=chat_id).first()
+        session.query(PlayerModel)
+        .filter_by(tg_id=user_id, room_id=chat_id, bot_ns=BOT_NS.get())
+        .first()
     )
     if not player:
         raise ValueError(f"Player with tg id {user_id} does not exist")
@@ -36,11 +83,17 @@ def set_balance(session, user_id, chat_id, amount):
 
 def get_player(session, user_id, chat_id, first_name):
     player = (
-        session.query(PlayerModel).filter_by(tg_id=user_id, room_id=chat_id).first()
+        session.query(PlayerModel)
+        .filter_by(tg_id=user_id, room_id=chat_id, bot_ns=BOT_NS.get())
+        .first()
     )
     if not player:
         player = PlayerModel(
-            tg_id=user_id, first_name=first_name, room_id=chat_id, balance=START_BALANCE
+            tg_id=user_id,
+            first_name=first_name,
+            room_id=chat_id,
+            bot_ns=BOT_NS.get(),
+            balance=START_BALANCE,
         )
         session.add(player)
         session.commit()
@@ -49,7 +102,9 @@ def get_player(session, user_id, chat_id, first_name):
 
 def get_player_by_id(session, user_id, chat_id):
     player = (
-        session.query(PlayerModel).filter_by(tg_id=user_id, room_id=chat_id).first()
+        session.query(PlayerModel)
+        .filter_by(tg_id=user_id, room_id=chat_id, bot_ns=BOT_NS.get())
+        .first()
     )
     if not player:
         raise ValueError(f"Player with tg id {user_id} does not exist")
@@ -57,9 +112,18 @@ def get_player_by_id(session, user_id, chat_id):
 
 
 def get_room(session, chat_id):
-    room = session.query(RoomModel).filter_by(chat_tg_id=chat_id).first()
+    room = (
+        session.query(RoomModel)
+        .filter_by(chat_tg_id=chat_id, bot_ns=BOT_NS.get())
+        .first()
+    )
     if not room:
-        room = RoomModel(chat_tg_id=chat_id, jackpot=JACKPOT_START, events=False)
+        room = RoomModel(
+            chat_tg_id=chat_id,
+            bot_ns=BOT_NS.get(),
+            jackpot=JACKPOT_START,
+            events=False,
+        )
         session.add(room)
         session.commit()
     return room
@@ -67,7 +131,11 @@ def get_room(session, chat_id):
 
 def load_event_chats() -> set[int]:
     with SessionLocal() as s:
-        rows = s.execute(select(RoomModel.chat_tg_id).where(RoomModel.events == True))
+        rows = s.execute(
+            select(RoomModel.chat_tg_id).where(
+                RoomModel.events == True, RoomModel.bot_ns == BOT_NS.get()
+            )
+        )
         return {row[0] for row in rows}
 
 
@@ -0,0 +1,171 @@
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+
+from games.bjengine import DEALER_STAND, Round, precheck
+from games.cards import CARD_VALUE, RANKS, SUITS
+
+# Советник: ход с наибольшим матожиданием для активной руки. Считается по
+# составу невидимых карт — остаток шуза плюс закрытая карта дилера, ровно
+# то, что знает игрок, следивший за столом с последней тасовки. Динамика
+# по состояниям руки (сумма, мягкость) для заданного состава; итоги
+# дилера, EV рук и ответы кэшируются по составу, так что повторная
+# отрисовка того же хода берёт ответ из кэша.
+#
+# Приближения: все добираемые карты тянутся из состава на момент решения
+# (без выбывания внутри руки — иначе дерево растёт до сотен миллисекунд);
+# после сплита рука доигрывается без пересплита; 3:2 без округления.
+
+Comp = Tuple[int, ...]  # невидимые карты по очкам: туз, 2..9, 10
+Probs = Tuple[float, ...]  # те же карты как вероятности следующей
+Odds = Tuple[float, ...]  # итог дилера: 17..21, перебор, натуральный 21
+
+BUST, NATURAL = 5, 6
+ADVISED = ("hit", "stand", "double", "split", "escape")
+
+# туз в составе считается за 1, мягкость руки — отдельным флагом
+CARD_POINTS = tuple(1 if v == 11 else v for v in CARD_VALUE)
+RANK_POINTS = tuple(CARD_POINTS[r * len(SUITS)] for r in range(len(RANKS)))
+
+
+def _total(hard: int, ace: bool) -> int:
+    return hard + 10 if ace and hard <= 11 else hard
+
+
+@lru_cache(maxsize=4096)
+def _probs(comp: Comp) -> Probs:
+    n = sum(comp)
+    return tuple(k / n for k in comp)
+
+
+@lru_cache(maxsize=1 << 16)
+def _dealer_from(hard: int, ace: bool, probs: Probs) -> Odds:
+    total = _total(hard, ace)
+    out = [0.0] * 7
+    if total >= DEALER_STAND:
+        out[BUST if total > 21 else total - 17] = 1.0
+        return tuple(out)
+    for i, p in enumerate(probs):
+        if p:
+            for j, q in enumerate(_dealer_from(hard + i + 1, ace or i == 0, probs)):
+                out[j] += p * q
+    return tuple(out)
+
+
+@lru_cache(maxsize=4096)
+def dealer_odds(up: int, probs: Probs) -> Odds:
+    # up — очки открытой карты (туз = 1), закрытая карта — из того же состава
+    out = [0.0] * 7
+    for i, p in enumerate(probs):
+        if not p:
+            continue
+        if {up, i + 1} == {1, 10}:
+            out[NATURAL] += p
+        else:
+            for j, q in enumerate(_dealer_from(up + i + 1, up == 1 or i == 0, probs)):
+                out[j] += p * q
+    return tuple(out)
+
+
+def _stand(total: int, odds: Odds, natural: bool = False) -> float:
+    if total > 21:
+        return -1.0
+    if natural:
+        return 1.5 * (1 - odds[NATURAL])
+    # дилер не подглядывает: его натуральный 21 бьёт любую не-натуральную руку
+    ev = odds[BUST] - odds[NATURAL]
+    for j in range(5):
+        ev += odds[j] * ((total > 17 + j) - (total < 17 + j))
+    return ev
+
+
+def _hit(hard: int, ace: bool, probs: Probs, odds: Odds) -> float:
+    return sum(
+        p * _best(hard + i + 1, ace or i == 0, probs, odds)
+        for i, p in enumerate(probs)
+        if p
+    )
+
+
+@lru_cache(maxsize=1 << 16)
+def _best(hard: int, ace: bool, probs: Probs, odds: Odds) -> float:
+    # рука из трёх и больше карт: только «ещё» или «хватит»
+    total = _total(hard, ace)
+    if total > 21:
+        return -1.0
+    if total == 21:
+        return _stand(21, odds)
+    return max(_stand(total, odds), _hit(hard, ace, probs, odds))
+
+
+def _double(hard: int, ace: bool, probs: Probs, odds: Odds) -> float:
+    return 2 * sum(
+        p * _stand(_total(hard + i + 1, ace or i == 0), odds)
+        for i, p in enumerate(probs)
+        if p
+    )
+
+
+def _split(points: int, probs: Probs, odds: Odds) -> float:
+    # каждая из двух рук добирает вторую карту; двухкарточные 21 после
+    # сплита движок тоже платит как натуральные
+    ev = 0.0
+    for i, p in enumerate(probs):
+        if not p:
+            continue
+        hard, ace = points + i + 1, points == 1 or i == 0
+        total = _total(hard, ace)
+        ev += p * max(
+            _stand(total, odds, natural=total == 21),
+            _hit(hard, ace, probs, odds),
+            _double(hard, ace, probs, odds),
+        )
+    return 2 * ev
+
+
+@lru_cache(maxsize=4096)
+def expected_values(
+    cards: Tuple[int, ...], up: int, comp: Comp, allowed: Tuple[str, ...]
+) -> Dict[str, float]:
+    probs = _probs(comp)
+    odds = dealer_odds(up, probs)
+    points = [CARD_POINTS[c] for c in cards]
+    hard, ace = sum(points), 1 in points
+    total = _total(hard, ace)
+    evs = {}
+    for act in allowed:
+        if act == "stand":
+            evs[act] = _stand(total, odds, natural=total == 21 and len(cards) == 2)
+        elif act == "hit":
+            evs[act] = _hit(hard, ace, probs, odds)
+        elif act == "double":
+            evs[act] = _double(hard, ace, probs, odds)
+        elif act == "split":
+            evs[act] = _split(points[0], probs, odds)
+        elif act == "escape":
+            evs[act] = -0.5
+    return evs
+
+
+def unseen(rnd: Round) -> Comp:
+    # остаток шуза плюс закрытая карта дилера; всё остальное игрок видел
+    counts = [0] * 10
+    for rank, k in enumerate(rnd.shoe.counts):
+        counts[RANK_POINTS[rank] - 1] += k
+    for c in rnd.dealer.hand[1:]:
+        counts[CARD_POINTS[c] - 1] += 1
+    return tuple(counts)
+
+
+def advise(rnd: Round) -> Optional[str]:
+    # лучший из доступных активной руке ходов
+    player = rnd.active_player
+    if player is None:
+        return None
+    allowed = tuple(a for a in ADVISED if precheck(rnd, a) is None)
+    evs = expected_values(
+        tuple(player.hand.cards),
+        CARD_POINTS[rnd.dealer.hand[0]],
+        unseen(rnd),
+        allowed,
+    )
+    return max(evs, key=evs.get)
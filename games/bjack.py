@@ -1,24 +1,30 @@
-import math
-import random
-from enum import Enum
-from functools import wraps, partial
-from collections import defaultdict
-from dataclasses import dataclass, field
-from typing import List, Dict
+import time
+from functools import lru_cache, wraps, partial
+from dataclasses import dataclass
+from typing import Dict, Optional
 
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, CallbackQueryHandler, CommandHandler
-from items import ITEMS, ItemId, player_has_item, change_item_amount
+from items import ITEMS, ItemId, on_reload
 from handlers import HandlerBlackJack
-from db import (
-    SessionLocal,
-    get_player,
-    get_player_by_id,
-    set_balance,
-    change_balance,
-    change_balance_f,
+from db import SessionLocal, get_player, get_player_by_id
+from config import (
+    BJ_DECKS,
+    BJ_EDIT_INTERVAL,
+    BJ_PENETRATION,
+    BJ_RESTART,
+    SESSION_RESULTS_LIMIT,
 )
-from config import BJ_RESTART, FREE_MONEY
+import outbox
+from actors import game_command, game_handler
+from games import bjengine as engine
+from games.advisor import advise
+from games import checkpoint
+from games.bjengine import Credit, Hint, Profit, Stage, UseItem
+from games.cards import CARD_STR, Shoe
+from games.escrow import RoundEscrow
+from callbacks import early_ack, follow_up
+from tracing import TRACER
 
 from telegram.error import BadRequest, RetryAfter
 
@@ -29,99 +35,110 @@ def safe_game_method(func):
         try:
             return await func(self, *args, **kwargs)
         except Exception as e:
-            await self.ctx.bot.send_message(
-                chat_id=self.chat_id,
-                text=f"⚠️ Произошла ошибка в {func.__name__}: {e}, игра будет остановлена, ставки возвращены, но это не точно.",
-            )
             import traceback
 
             traceback.print_exc()
+            self.trace.error("crash", method=func.__name__, error=repr(e))
 
+            # удержанное в раунде (ставки и доплаты) возвращается одной
+            # транзакцией вместе с уведомлением; предметы так и не списывались
             with SessionLocal() as db:
-                for player in self.players:
-                    change_balance(db, player.uid, self.chat_id, player.bet)
+                self.escrow.release(db)
+                checkpoint.drop(db, self.chat_id)
+                self.ctx.application.bot_data["outbox"].stage(
+                    db,
+                    outbox.send(
+                        self.chat_id,
+                        f"⚠️ Произошла ошибка в {func.__name__}: {e}, игра будет остановлена, ставки возвращены.",
+                    ),
+                )
                 db.commit()
+            self.escrow.clear()
 
             self.cleanup()
             self._paused_msg = "⚠️ Кирдык"
+            self._dirty = None  # стол упавшей игры больше не перерисовываем
 
     return wrapper
 
 
-class Stage(Enum):
-    Bet = "bet"
-    Play = "play"
-    End = "end"
-    Close = "close"
-
-
 BET_TIMEOUT = BJ_RESTART
 ACTION_TIMEOUT = 20
 RESTART_DELAY = BJ_RESTART
 
+# таймеры стадии: пауза их снимает, _recover ставит заново
+STAGE_TIMERS = ("bj_end_bet", "bj_auto_stand", "bj_restart")
+
 FIXED_BETS = [50, 100, 200, 300, 500]
 PERCENT_BETS = [10, 20, 30, 50, 100]
 
-RANKS = ["2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K", "A"]
-SUITS = ["♠", "♥", "♦", "♣"]
-
-
-def build_deck():
-    deck = [r + s for r in RANKS for s in SUITS]
-    random.shuffle(deck)
-    return deck
-
 
-def hand_value(hand):
-    total, aces = 0, 0
-    for card in hand:
-        rank = card[:-1]
-        if rank in ("J", "Q", "K"):
-            total += 10
-        elif rank == "A":
-            total += 11
-            aces += 1
-        else:
-            total += int(rank)
-    while total > 21 and aces:
-        total -= 10
-        aces -= 1
-    return total
-
-
-def can_split(hand: list[str]) -> bool:
-    if len(hand) != 2:
-        return False
+# предметы, от которых зависит отрисовка стола и кнопки хода
+TABLE_ITEMS = (
+    ItemId.Calculator,
+    ItemId.Insurance,
+    ItemId.HotCard,
+    ItemId.Escape,
+    ItemId.Advisor,
+)
 
-    rank1 = hand[0][:-1]
-    rank2 = hand[1][:-1]
 
-    return rank1 == rank2
+def items_snapshot(p) -> Dict[str, int]:
+    inv = p.items or {}
+    return {str(i): inv[str(i)] for i in TABLE_ITEMS if inv.get(str(i))}
+
+
+# Клавиатуры неизменяемы, поэтому собираются один раз и раздаются всем
+# столам: ставочная — константа, игровых вариантов немного — по маске
+# доступных ходов и ходу советника.
+BET_KEYBOARD = InlineKeyboardMarkup(
+    [
+        [InlineKeyboardButton(str(x), callback_data=f"bj_bet_{x}") for x in FIXED_BETS],
+        [
+            InlineKeyboardButton(f"{x}%", callback_data=f"bj_bet_pct_{x}")
+            for x in PERCENT_BETS
+        ],
+        [
+            InlineKeyboardButton("Микрозайм", callback_data="bj_bet_mz"),
+        ],
+    ]
+)
 
+# необязательные кнопки хода: бит в маске — кнопка есть; у предметов
+# подпись — название из реестра
+PLAY_OPTIONS = (
+    ("double", "🚀 Удвоить"),
+    ("split", "✂️ Разделить"),
+    ("insurance", ItemId.Insurance),
+    ("hotcard", ItemId.HotCard),
+    ("escape", ItemId.Escape),
+)
 
-def first_card_is_ace(hand: list[str]) -> bool:
-    if len(hand) < 1:
-        return False
-    return hand[0][:-1] == "A"
 
+@lru_cache(maxsize=None)
+def play_keyboard(mask: int, best: Optional[str]) -> InlineKeyboardMarkup:
+    # у владельца советника лучший по матожиданию ход отмечен 🧭
+    def button(text: str, act: str) -> InlineKeyboardButton:
+        if act == best:
+            text = "🧭 " + text
+        return InlineKeyboardButton(text, callback_data=f"bj_act_{act}")
 
-@dataclass
-class Player:
-    uid: int
-    name: str
-    hand: List[str] = field(default_factory=list)
-    bet: int = 0
-    balance: int = 0
-    splitted: bool = False
-    escape: bool = False
-    insurance: bool = False
-    insurance_bet: int = 0
-    result: str = ""
+    options = [
+        button(ITEMS[text].name if text in ITEMS else text, act)
+        for i, (act, text) in enumerate(PLAY_OPTIONS)
+        if mask >> i & 1
+    ]
+    # удвоение и сплит — в один ряд, предметы — по одному в ряд
+    rows = [[button("🕹️ Взять карту", "hit"), button("🚗💨 Хватит", "stand")]]
+    paired = (mask & 1) + (mask >> 1 & 1)
+    if paired:
+        rows.append(options[:paired])
+    rows += [[b] for b in options[paired:]]
+    return InlineKeyboardMarkup(rows)
 
 
-@dataclass
-class Dealer:
-    hand: List[str] = field(default_factory=list)
+# новые названия предметов — новые клавиатуры
+on_reload(play_keyboard.cache_clear)
 
 
 @dataclass
@@ -137,21 +154,30 @@ class BlackjackGame:
         self.chat_id = chat_id
         self.msg_id = msg_id
         self.ctx = context
-        self.stage = Stage.Bet
-        self.dealer = Dealer()
-        self.players: List[Player] = []
-        self.active_player_index = 0
-        self.deck = []
+        # правила и состояние раунда — в движке, здесь телеграм, таймеры и БД
+        self.round = engine.Round(shoe=Shoe(BJ_DECKS, BJ_PENETRATION))
         self.session_results: Dict[int, SessionResults] = {}
+        self.escrow = RoundEscrow(chat_id)
+        self._trimmed_results = 0
+        self.trace = TRACER.trace(chat_id)
 
-        self.timer = None
+        # таймауты игры — в общей куче бота, ключ (чат, вид)
+        self.timers = context.application.bot_data["timers"]
 
+        # (uid, номер руки) -> (что видно, строка): после сплита рук у игрока
+        # несколько, у каждой своя строка
+        self._lines: Dict[tuple, tuple] = {}
         self._last_table = None
         self._last_keyboard = None
+        self._last_edit = 0.0
+        self._dirty = None  # (header, footer) неотрисованного состояния
+        # таймер перерисовки — свой у каждого стола: финальная правка
+        # закрытого стола и первая правка нового в том же чате не путаются
+        self._flush_timer = f"bj_flush_{msg_id}"
+        self._edits = 0
         self._close_game_msg = None
         self._paused = False
         self._paused_msg = None
-        self._paused_timeout = None
 
     @classmethod
     @safe_game_method
@@ -164,127 +190,82 @@ class BlackjackGame:
         )
 
         game = cls(update.effective_chat.id, msg.message_id, context)
-        game.stage = Stage.Bet
 
         context.application.bot_data.setdefault("games", {})[msg.chat.id] = game
-        game.dealer.hand = []
+        with SessionLocal() as db:
+            game._checkpoint(db, Stage.Bet)
+            db.commit()
+        game.trace.info("start", msg=game.msg_id)
         await game.update_table()
 
-        game.timer = context.job_queue.run_once(
-            game.end_bet,
-            when=BET_TIMEOUT,
-            chat_id=game.chat_id,
-            name=f"bj_end_bet_{game.chat_id}",
-        )
+        game.timers.schedule(game.chat_id, "bj_end_bet", BET_TIMEOUT, game.end_bet)
 
-    @staticmethod
-    def _build_bet_keyboard() -> InlineKeyboardMarkup:
-        buttons = [
-            [
-                InlineKeyboardButton(str(x), callback_data=f"bj_bet_{x}")
-                for x in FIXED_BETS
-            ],
-            [
-                InlineKeyboardButton(f"{x}%", callback_data=f"bj_bet_pct_{x}")
-                for x in PERCENT_BETS
-            ],
-            [
-                InlineKeyboardButton("Микрозайм", callback_data="bj_bet_mz"),
-            ],
-        ]
-        return InlineKeyboardMarkup(buttons)
+    @classmethod
+    async def resume(cls, context: ContextTypes.DEFAULT_TYPE, chat_id: int, data):
+        # стол из чекпоинта после рестарта: раздача прерванного раунда уже
+        # возвращена, итоги сессии те же, сообщение то же — открываем ставки
+        game = cls(chat_id, data["msg"], context)
+        for uid, name, profit, start_balance in data["results"]:
+            game.session_results[uid] = SessionResults(uid, name, profit, start_balance)
+        game._trimmed_results = data["trimmed"]
+        context.application.bot_data["games"][chat_id] = game
+        game.trace.info("resume", msg=game.msg_id, refunded=len(data["holds"]))
+
+        if data["holds"]:
+            header = "♻️ Бот перезапускался, ставки прерванной раздачи возвращены"
+        else:
+            header = "♻️ Бот перезапускался, открыта новая раздача"
+        await game.update_table(header=header)
+        game.timers.schedule(chat_id, "bj_end_bet", BET_TIMEOUT, game.end_bet)
+
+    def _checkpoint(self, db, stage: Stage, holds=()):
+        # снимок на смене стадии: рука, шуз и ставки стадии Bet не пишутся,
+        # поднятый стол всё равно начинает с новой раздачи
+        checkpoint.save(
+            db,
+            self.chat_id,
+            "bj",
+            stage.value,
+            {
+                "msg": self.msg_id,
+                "holds": list(holds),
+                "results": [
+                    [r.uid, r.name, r.profit, r.start_balance]
+                    for r in self.session_results.values()
+                ],
+                "trimmed": self._trimmed_results,
+            },
+        )
 
     def _build_play_keyboard(self) -> InlineKeyboardMarkup:
-        rows = [
-            [
-                InlineKeyboardButton("🕹️ Взять карту", callback_data="bj_act_hit"),
-                InlineKeyboardButton("🚗💨 Хватит", callback_data="bj_act_stand"),
-            ]
-        ]
-
-        active_player = self._active_player()
-        hand = active_player.hand
-        with SessionLocal() as db:
-            ds_buttons = []
-            p = get_player_by_id(db, active_player.uid, self.chat_id)
-            if p.balance >= active_player.bet and len(hand) == 2:
-                ds_buttons.append(
-                    InlineKeyboardButton("🚀 Удвоить", callback_data="bj_act_double")
-                )
-                if can_split(hand):
-                    splits_done = sum(
-                        1
-                        for pl in self.players
-                        if pl.uid == active_player.uid and pl.splitted
-                    )
-                    if splits_done < 3:
-                        ds_buttons.append(
-                            InlineKeyboardButton(
-                                "✂️ Разделить", callback_data="bj_act_split"
-                            )
-                        )
-            if ds_buttons:
-                rows.append(ds_buttons)
-
-            insurance_bet = math.ceil(active_player.bet / 2)
-            if (
-                p.balance >= insurance_bet
-                and len(hand) == 2
-                and first_card_is_ace(self.dealer.hand)
-                and player_has_item(p, ItemId.Insurance)
-                and not active_player.insurance
-            ):
-                rows.append(
-                    [
-                        InlineKeyboardButton(
-                            ITEMS[ItemId.Insurance].name,
-                            callback_data=f"bj_act_insurance",
-                        )
-                    ]
-                )
-            if player_has_item(p, ItemId.HotCard):
-                rows.append(
-                    [
-                        InlineKeyboardButton(
-                            ITEMS[ItemId.HotCard].name,
-                            callback_data="bj_act_hotcard",
-                        )
-                    ]
-                )
-            if (
-                player_has_item(p, ItemId.Escape)
-                and not active_player.escape
-                and len(hand) == 2
-                and not active_player.insurance
-            ):
-                rows.append(
-                    [
-                        InlineKeyboardButton(
-                            ITEMS[ItemId.Escape].name,
-                            callback_data="bj_act_escape",
-                        )
-                    ]
-                )
-
-        return InlineKeyboardMarkup(rows)
+        # кнопка есть, только если движок примет ход
+        mask = 0
+        for i, (act, _) in enumerate(PLAY_OPTIONS):
+            if engine.precheck(self.round, act) is None:
+                mask |= 1 << i
+        best = None
+        if self._active_player().has_item(ItemId.Advisor):
+            best = advise(self.round)
+        return play_keyboard(mask, best)
+
+    @property
+    def stage(self) -> Stage:
+        return self.round.stage
 
     def _active_player(self):
-        if self.active_player_index < len(self.players):
-            return self.players[self.active_player_index]
-        else:
-            return None
+        return self.round.active_player
 
     def _build_keyboard(self) -> InlineKeyboardMarkup:
         if self.stage == Stage.Bet:
-            return self._build_bet_keyboard()
-        elif self.stage == Stage.Play and not self._active_player() is None:
+            return BET_KEYBOARD
+        elif self.stage == Stage.Play and self._active_player() is not None:
             return self._build_play_keyboard()
         return None
 
     @safe_game_method
     async def _build_table(self, header: str = None, footer: str = ""):
-        print(
-            f"Building table for chat {self.chat_id}, stage: {self.stage}, paused: {self._paused}, players: {self.players}, dealer: {self.dealer}"
+        self.trace.debug(
+            "render", stage=self.stage.value, players=len(self.round.players)
         )
         lines = []
 
@@ -294,45 +275,19 @@ class BlackjackGame:
             lines.append(header + "\n")
 
         active_player = self._active_player()
-        if self.stage == Stage.Play and not active_player is None:
-            first = self.dealer.hand[0]
-            val = hand_value([first])
+        dealer = self.round.dealer.hand
+        if self.stage == Stage.Play and active_player is not None:
+            first = CARD_STR[dealer[0]]
             lines.append(f"🤵 Дилер: {first}\n")
         elif self.stage == Stage.End:
-            cards = " ".join(self.dealer.hand)
-            val = hand_value(self.dealer.hand)
-            lines.append(f"🤵 Дилер: {cards} [{val}]\n")
-
-        for player in self.players:
-            cards = " ".join(player.hand)
-            val = hand_value(player.hand)
-            has_calculator = False
-            with SessionLocal() as db:
-                p = get_player_by_id(db, player.uid, self.chat_id)
-                has_calculator = player_has_item(p, ItemId.Calculator)
-
-            prefix = ""
-            if player.insurance:
-                prefix = "🛡"
-            if player.escape:
-                prefix = "🏃"
-            active_mark = (
-                "🔸" if self.stage == Stage.Play and player == active_player else "•"
-            )
-            prefix += f"{active_mark}"
+            lines.append(f"🤵 Дилер: {dealer} [{dealer.value}]\n")
 
-            if self.stage == Stage.Bet:
-                lines.append(
-                    f"{prefix}{player.name} | 💸: {player.bet} | 🏦: {player.balance}"
-                )
-            elif self.stage == Stage.Play and not has_calculator:
-                lines.append(f"{prefix} {player.name}: {cards}")
-            else:
-                lines.append(f"{prefix} {player.name}: {cards} [{val}]")
+        for i, player in enumerate(self.round.players):
+            lines.append(self._player_line(i, player, player is active_player))
 
         if self.stage == Stage.End:
             lines.append("\nРезультаты:")
-            for player in self.players:
+            for player in self.round.players:
                 res = player.result
                 lines.append(f"{res}")
 
@@ -348,54 +303,74 @@ class BlackjackGame:
         keyboard = self._build_keyboard()
         return "\n".join(lines), keyboard
 
+    def _player_line(self, index: int, player, active: bool) -> str:
+        # строка игрока пересобирается, только когда поменялось то, что в
+        # ней видно; строка руки сама кэшируется в Hand до следующей карты
+        stage = self.stage
+        hand = str(player.hand)
+        show_value = stage != Stage.Play or player.has_item(ItemId.Calculator)
+        key = (
+            stage,
+            active and stage == Stage.Play,
+            player.insurance,
+            player.escape,
+            player.name,
+            player.bet,
+            player.balance,
+            hand,
+            show_value,
+        )
+        cached = self._lines.get((player.uid, index))
+        if cached is not None and cached[0] == key:
+            return cached[1]
+
+        prefix = ""
+        if player.insurance:
+            prefix = "🛡"
+        if player.escape:
+            prefix = "🏃"
+        prefix += "🔸" if key[1] else "•"
+
+        if stage == Stage.Bet:
+            line = f"{prefix}{player.name} | 💸: {player.bet} | 🏦: {player.balance}"
+        elif not show_value:
+            line = f"{prefix} {player.name}: {hand}"
+        else:
+            line = f"{prefix} {player.name}: {hand} [{player.hand.value}]"
+        self._lines[(player.uid, index)] = (key, line)
+        return line
+
     async def _pause_game(self, delay_seconds: int, notice: str):
-        print(f"Pausing game {self.chat_id} for {delay_seconds} seconds")
-        if self._paused:
+        self.trace.warning("pause", delay=delay_seconds, notice=notice)
+        if (
+            self._paused
+            or self.ctx.application.bot_data["games"].get(self.chat_id) is not self
+        ):
+            # у закрытого стола ставить на паузу нечего, а таймеры чата
+            # уже могут быть новой игры
             return
 
         self._paused = True
         self._paused_msg = (
             f"{notice}, игра скоро возобновится, подождите {delay_seconds} сек."
         )
-        if self.timer:
-            try:
-                self.timer.schedule_removal()
-            except Exception:
-                pass
-
-        self.pause_timer = self.ctx.job_queue.run_once(
-            self._recover,
-            when=delay_seconds,
-            chat_id=self.chat_id,
-            name=f"bj_recover_{self.chat_id}",
-        )
+        self.timers.cancel(self.chat_id, *STAGE_TIMERS)
+        self.timers.schedule(self.chat_id, "bj_recover", delay_seconds, self._recover)
 
-    async def _recover(self, job_ctx=None):
-        print(f"Recovering game {self.chat_id} after pause")
+    async def _recover(self):
+        self.trace.info("unpause", stage=self.stage.value)
         self._paused = False
         self._paused_msg = None
-        self._paused_timeout = None
 
         await self.update_table(header="♻️ Игра возобновлена")
 
         if self.stage == Stage.Bet:
-            print("Resuming betting stage")
-            self.timer = self.ctx.job_queue.run_once(
-                self.end_bet,
-                when=BET_TIMEOUT,
-                chat_id=self.chat_id,
-                name=f"bj_end_bet_{self.chat_id}",
-            )
+            self.timers.schedule(self.chat_id, "bj_end_bet", BET_TIMEOUT, self.end_bet)
         elif self.stage == Stage.Play:
-            print("Resuming play stage")
             await self.next_turn()
         elif self.stage == Stage.End:
-            print("Resuming end stage")
-            self.ctx.job_queue.run_once(
-                self._restart_game,
-                when=RESTART_DELAY,
-                chat_id=self.chat_id,
-                name=f"bj_restart_{self.chat_id}",
+            self.timers.schedule(
+                self.chat_id, "bj_restart", RESTART_DELAY, self._restart_game
             )
 
     @safe_game_method
@@ -406,69 +381,118 @@ class BlackjackGame:
                 self._paused_msg,
                 show_alert=True,
             )
+        if self.stage != Stage.Bet:
+            return await query.answer("Ставки уже не принимаются")
+        await early_ack(query)
 
         uid = query.from_user.id
-        player = next((p for p in self.players if p.uid == uid), None)
-        tmp_bet = player.bet if player else 0
         parts = query.data.split("_")
         with SessionLocal() as db:
             p = get_player(db, uid, self.chat_id, query.from_user.first_name)
-            total_balance = p.balance + tmp_bet
-            if parts[2] == "mz":
-                if total_balance >= FREE_MONEY:
-                    return await query.answer("У тебя еще есть деньги", show_alert=True)
-                amount = FREE_MONEY
-                total_balance = FREE_MONEY
-            elif total_balance <= 0:
-                return await query.answer("Нет монеточек", show_alert=True)
-            elif parts[2] == "pct":
-                pct = int(parts[3])
-                amount = total_balance * pct // 100
-            else:
-                amount = int(parts[2])
-
-            if amount <= 0 or amount > total_balance:
-                return await query.answer("Неверная ставка", show_alert=True)
-            if amount == tmp_bet:
-                return await query.answer("Такая ставка уже сделана", show_alert=False)
-
-            if uid not in self.session_results:
-                self.session_results[uid] = SessionResults(
-                    uid=uid,
-                    name=query.from_user.first_name,
-                    profit=0,
-                    start_balance=p.balance,
-                )
-            set_balance(db, uid, self.chat_id, total_balance - amount)
-            db.commit()
+            balance, items = p.balance, items_snapshot(p)
 
-        new_player = Player(
-            uid=uid,
-            name=query.from_user.first_name,
-            bet=amount,
-            balance=p.balance,
+        kind = parts[2]
+        value = int(parts[3] if kind == "pct" else 0 if kind == "mz" else kind)
+        error = engine.place_bet(
+            self.round, uid, query.from_user.first_name, balance, items, kind, value
         )
-        if player:
-            for i, pl in enumerate(self.players):
-                if pl.uid == uid:
-                    self.players[i] = new_player
+        if error:
+            text, alert = error
+            if alert:
+                follow_up(context, self.chat_id, query.from_user, text)
+            return
+
+        if uid in self.session_results:
+            # порядок словаря — от давно ставивших к недавним
+            self.session_results[uid] = self.session_results.pop(uid)
         else:
-            self.players.append(new_player)
+            self._trim_session_results()
+            self.session_results[uid] = SessionResults(
+                uid=uid,
+                name=query.from_user.first_name,
+                profit=0,
+                start_balance=balance,
+            )
 
-        await query.answer(f"Ставка {amount} принята")
         await self.update_table()
 
+    def _trim_session_results(self):
+        # итоги сессии храним не больше чем для SESSION_RESULTS_LIMIT игроков,
+        # место освобождают те, кто дольше всех не ставил
+        seated = {p.uid for p in self.round.players}
+        while len(self.session_results) >= SESSION_RESULTS_LIMIT:
+            uid = next((u for u in self.session_results if u not in seated), None)
+            if uid is None:
+                break
+            del self.session_results[uid]
+            self._trimmed_results += 1
+
+    def _apply(self, effects) -> str | None:
+        # кошелёк и инвентарь раунда движок уже поправил, здесь — проводка
+        # в эскроу и итоги сессии; подсказку возвращаем для ответа на нажатие.
+        # Доплаты (Spend) уже сняты с баланса в _reserve
+        hint = None
+        for e in effects:
+            if isinstance(e, Credit):
+                self.escrow.credit(e.uid, e.amount)
+            elif isinstance(e, UseItem):
+                self.escrow.use_item(e.uid, e.item_id)
+            elif isinstance(e, Profit):
+                self.session_results[e.uid].profit += e.amount
+            elif isinstance(e, Hint):
+                hint = e.text
+        return hint
+
+    def _reserve(self, uid: int, amount: int) -> bool:
+        # доплата снимается с баланса до хода, вместе со снимком: упади
+        # раунд или бот — она вернётся так же, как ставка
+        with SessionLocal() as db:
+            ok = self.escrow.spend(db, uid, amount)
+            if ok:
+                self._checkpoint(db, Stage.Play, self.escrow.snapshot())
+                db.commit()
+                return True
+            balance = get_player_by_id(db, uid, self.chat_id).balance
+        # стол считал, что деньги есть: поправляем, лишние кнопки пропадут
+        for p in self.round.players:
+            if p.uid == uid:
+                p.balance = balance
+        self.trace.warning("short", uid=uid, amount=amount, balance=balance)
+        return False
+
+    def _hold_stakes(self):
+        players = self.round.players
+        with SessionLocal() as db:
+            balances = self.escrow.hold(
+                db,
+                {p.uid: p.bet for p in players},
+                loans={p.uid for p in players if p.loan},
+            )
+            self._checkpoint(db, Stage.Play, self.escrow.snapshot())
+            db.commit()
+        self.escrow.confirm()
+
+        box = self.ctx.application.bot_data["outbox"]
+        for player in engine.confirm_stakes(self.round, balances):
+            box.put(
+                outbox.send(
+                    self.chat_id,
+                    f"⚠️ {player.name}: ставка не принята, не хватило монет",
+                )
+            )
+
     @safe_game_method
-    async def end_bet(self, job_ctx=None):
-        print(
-            f"Ending betting for chat {self.chat_id}, stage: {self.stage}, paused: {self._paused}"
-        )
+    async def end_bet(self):
+        self.trace.info("end_bet", players=len(self.round.players), paused=self._paused)
         if self._paused:
             return
 
-        if not self.players:
-            if self.session_results:
-                with SessionLocal() as db:
+        if self.round.players:
+            self._hold_stakes()
+
+        if not self.round.players:
+            with SessionLocal() as db:
+                if self.session_results:
                     lines = ["Стол закрыт, итоги:"]
                     for uid, result in self.session_results.items():
                         p = get_player_by_id(db, uid, self.chat_id)
@@ -478,57 +502,47 @@ class BlackjackGame:
                         lines.append(
                             f"• {name}: игра: {sign}{result.profit}, баланс: {sign_b}{p.balance - result.start_balance}"
                         )
+                    if self._trimmed_results:
+                        lines.append(f"• и ещё игроков: {self._trimmed_results}")
                     self._close_game_msg = "\n".join(lines)
-            else:
-                self._close_game_msg = "Никто не поставил — игра отменена."
+                else:
+                    self._close_game_msg = "Никто не поставил — игра отменена."
+                checkpoint.drop(db, self.chat_id)
+                db.commit()
 
-            self.stage = Stage.Close
+            self.round.stage = Stage.Close
             await self.update_table()
             if self._paused:
                 return
             self.cleanup()
             return
 
-        self.stage = Stage.Play
-        self.deck = build_deck()
-        self.dealer.hand = [
-            # "A♠",
-            # "10♣",
-            self.deck.pop(),
-            self.deck.pop(),
-        ]
-        for player in self.players:
-            player.hand = [
-                self.deck.pop(),
-                self.deck.pop(),
-            ]
-        await self.update_table()
+        shuffled = engine.deal(self.round)
+        await self.update_table(header="🔀 Шуз перетасован" if shuffled else None)
         await self.next_turn()
 
     @safe_game_method
     async def next_turn(self):
-        print(
-            f"Next turn for chat {self.chat_id}, , stage: {self.stage}, paused: {self._paused}"
+        self.trace.debug(
+            "next_turn", idx=self.round.active_player_index, paused=self._paused
         )
         if self._paused:
             return
         active_player = self._active_player()
         if active_player:
-            self.timer = self.ctx.job_queue.run_once(
+            self.timers.schedule(
+                self.chat_id,
+                "bj_auto_stand",
+                ACTION_TIMEOUT,
                 partial(self._do_action, "stand", None),
-                when=ACTION_TIMEOUT,
-                chat_id=self.chat_id,
-                name=f"bj_auto_stand_{self.chat_id}",
             )
         else:
             await self.finish_round()
 
     @safe_game_method
     async def handle_action(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
-        print(
-            f"Handling action for chat {self.chat_id}, , stage: {self.stage}, paused: {self._paused}"
-        )
         query = update.callback_query
+        self.trace.debug("tap", uid=query.from_user.id, data=query.data)
         if self._paused:
             return await query.answer(
                 self._paused_msg,
@@ -543,266 +557,93 @@ class BlackjackGame:
         ):
             return await query.answer("Не ваш ход", show_alert=True)
         act = query.data.split("_")[-1]
-        if self.timer:
-            try:
-                self.timer.schedule_removal()
-            except Exception as e:
-                print(f"Error handle_action: {e}")
+        error = engine.precheck(self.round, act)
+        if error:
+            return await query.answer(error, show_alert=True)
+        # у hotcard подсказка и есть ответ на нажатие, её отдаём после списания
+        if act != "hotcard":
+            await early_ack(query)
+        amount = engine.cost(self.round, act)
+        if amount and not self._reserve(uid, amount):
+            follow_up(context, self.chat_id, query.from_user, "Недостаточно средств")
+            return await self.update_table()
+        self.timers.cancel(self.chat_id, "bj_auto_stand")
         await self._do_action(act, query)
 
     @safe_game_method
-    async def _handle_hotcard(self, active_player) -> str:
-        with SessionLocal() as db:
-            p = get_player_by_id(db, active_player.uid, self.chat_id)
-            if not player_has_item(p, ItemId.HotCard):
-                return f"У вас нет {ITEMS[ItemId.HotCard].name}."
-            change_item_amount(p, ItemId.HotCard, -1)
-            db.commit()
-
-        lookahead = random.randint(4, 6)
-        upcoming = self.deck[-lookahead:]
-
-        high_ranks = {"10", "J", "Q", "K", "A"}
-        low_ranks = {"2", "3", "4", "5", "6", "7", "8", "9"}
-        cnt_high = sum(1 for c in upcoming if c[:-1] in high_ranks)
-        cnt_low = sum(1 for c in upcoming if c[:-1] in low_ranks)
-        total = cnt_high + cnt_low
-        if total == 0:
-            return "Недостаточно карт для анализа."
-
-        ratio = cnt_high / total
-
-        thr_high = 0.6
-        thr_low = 1 - thr_high
-
-        print("Hot card analysis:", upcoming, ratio, thr_high, thr_low)
-        if ratio >= thr_high:
-            hint = "🔥 Скорее всего впереди преимущественно старшие карты."
-        elif ratio <= thr_low:
-            hint = "❄️ Скорее всего впереди преимущественно младшие карты."
-        else:
-            hint = "⚖️ Явного перевеса в ближайших картах не заметно."
-
-        return hint
-
-    @safe_game_method
-    async def _do_action(self, act: str, query, job_ctx=None):
-        print(
-            f"Doing action '{act}' for chat {self.chat_id}, idx: {self.active_player_index}, stage: {self.stage}, paused: {self._paused}"
+    async def _do_action(self, act: str, query):
+        self.trace.debug(
+            "action", act=act, idx=self.round.active_player_index, auto=query is None
         )
 
-        active_player = self._active_player()
-        if act == "hit":
-            active_player.hand.append(self.deck.pop())
-        if act == "stand" or hand_value(active_player.hand) > 21:
-            self.active_player_index += 1
-        if act == "double":
-            with SessionLocal() as db:
-                p = get_player_by_id(db, active_player.uid, self.chat_id)
-                if p.balance < active_player.bet:
-                    if query:
-                        return await query.answer(
-                            "Недостаточно средств для удвоения ставки", show_alert=True
-                        )
-                change_balance_f(p, -active_player.bet)
-                active_player.bet *= 2
-                db.commit()
-            active_player.hand.append(self.deck.pop())
-            self.active_player_index += 1
-        if act == "split":
-            if can_split(active_player.hand) is False:
-                if query:
-                    return await query.answer(
-                        "Невозможно разделить руки", show_alert=True
-                    )
-            with SessionLocal() as db:
-                p = get_player_by_id(db, active_player.uid, self.chat_id)
-                if p.balance < active_player.bet:
-                    if query:
-                        return await query.answer(
-                            "Недостаточно средств для сплита", show_alert=True
-                        )
-                change_balance_f(p, -active_player.bet)
-                db.commit()
-            new_hand = [active_player.hand.pop(), self.deck.pop()]
-            self.players.append(
-                Player(
-                    uid=active_player.uid,
-                    name=active_player.name + " (✂️)",
-                    hand=new_hand,
-                    bet=active_player.bet,
-                    balance=p.balance,
-                    splitted=True,
-                )
-            )
-            active_player.hand.append(self.deck.pop())
-        if act == "insurance":
-            if active_player.insurance:
-                if query:
-                    return await query.answer(
-                        "Страховка уже действует", show_alert=True
-                    )
-            with SessionLocal() as db:
-                p = get_player_by_id(db, active_player.uid, self.chat_id)
-                if not player_has_item(p, ItemId.Insurance):
-                    if query:
-                        return await query.answer(
-                            "У вас нет страховки", show_alert=True
-                        )
-                insurance_bet = math.ceil(active_player.bet / 2)
-                if p.balance < insurance_bet:
-                    if query:
-                        return await query.answer(
-                            "Недостаточно средств для страховки", show_alert=True
-                        )
-                active_player.insurance = True
-                active_player.insurance_bet = insurance_bet
-                change_balance_f(p, -insurance_bet)
-                change_item_amount(p, ItemId.Insurance, -1)
-                db.commit()
-
+        hint = self._apply(engine.step(self.round, act))
         if act == "hotcard":
-            hint = await self._handle_hotcard(active_player)
             if query:
                 await query.answer(hint, show_alert=True)
             return
-        if act == "escape":
-            if active_player.escape:
-                if query:
-                    return await query.answer("Вы уже сбежали", show_alert=True)
-            with SessionLocal() as db:
-                p = get_player_by_id(db, active_player.uid, self.chat_id)
-                if not player_has_item(p, ItemId.Escape):
-                    if query:
-                        return await query.answer(
-                            "У вас нет предмета Побег", show_alert=True
-                        )
-                change_item_amount(p, ItemId.Escape, -1)
-                active_player.escape = True
-                db.commit()
-            self.active_player_index += 1
 
-        if query:
-            await query.answer()
         await self.update_table()
         await self.next_turn()
 
     @safe_game_method
     async def finish_round(self):
-        print(
-            f"Finishing round for chat {self.chat_id}, , stage: {self.stage}, paused: {self._paused}"
-        )
-        while hand_value(self.dealer.hand) < 17:
-            self.dealer.hand.append(self.deck.pop())
+        self._apply(engine.finish(self.round))
 
-        dealer_val = hand_value(self.dealer.hand)
-        dealer_nbj = dealer_val == 21 and len(self.dealer.hand) == 2
+        # выигрыши, доплаты и предметы всего раунда — одной транзакцией
         with SessionLocal() as db:
-            for player in self.players:
-                p = get_player_by_id(db, player.uid, self.chat_id)
-                player_val = hand_value(player.hand)
-                player_bet = player.bet
-                player_nbj = player_val == 21 and len(player.hand) == 2
-                player_profit = 0
-                res_str = ""
-
-                if player.escape:
-                    half_bet = math.ceil(player_bet / 2)
-                    player.result = f"🏃 {player.name} Побег -{half_bet}"
-                    change_balance_f(p, half_bet)
-                    self.session_results[player.uid].profit -= half_bet
-                    continue
-
-                if player_val > 21:
-                    res_str = f"💀 {player.name} -{player_bet}"
-                    player_profit -= player_bet
-
-                elif dealer_nbj and not player_nbj:
-                    res_str = f"💀 {player.name} -{player_bet}"
-                    player_profit -= player_bet
-
-                elif player_nbj and not dealer_nbj:
-                    win = math.ceil(player_bet * 1.5)  # 3:2
-                    res_str = f"💹 {player.name} +{player_bet + win}"
-                    player_profit += win
-                    change_balance_f(p, player_bet + win)
-
-                elif dealer_val > 21:
-                    win = player_bet
-                    res_str = f"💹 {player.name} +{player_bet + win}"
-                    player_profit += win
-                    change_balance_f(p, player_bet + win)
-
-                elif player_val > dealer_val:
-                    win = player_bet
-                    res_str = f"💹 {player.name} +{player_bet + win}"
-                    player_profit += win
-                    change_balance_f(p, player_bet + win)
-
-                elif player_val < dealer_val:
-                    res_str = f"💀 {player.name} -{player_bet}"
-                    player_profit = -player_bet
-
-                else:
-                    res_str = f"😐 {player.name} Ничья +{player_bet}"
-                    change_balance_f(p, player_bet)
-
-                if player.insurance:
-                    if dealer_nbj:
-                        insurance_win = player.insurance_bet * 3  # 2:1
-                        player_profit += player.insurance_bet * 2
-                        change_balance_f(p, insurance_win)
-                        res_str += f" 🛡+{insurance_win}"
-                    else:
-                        player_profit -= player.insurance_bet
-                        res_str += f" 🛡-{player.insurance_bet}"
-
-                player.result = res_str
-                self.session_results[player.uid].profit += player_profit
+            self.escrow.settle(db)
+            self._checkpoint(db, Stage.End)
             db.commit()
+        self.escrow.clear()
 
-        print("Session results:", self.session_results)
+        self.trace.info(
+            "finish",
+            players=len(self.round.players),
+            session=len(self.session_results),
+            edits=self._edits,
+        )
 
-        self.stage = Stage.End
         await self.update_table()
         if self._paused:
             return
-        self.ctx.job_queue.run_once(
-            self._restart_game,
-            when=RESTART_DELAY,
-            chat_id=self.chat_id,
-            name=f"bj_restart_{self.chat_id}",
+        self.timers.schedule(
+            self.chat_id, "bj_restart", RESTART_DELAY, self._restart_game
         )
 
     @safe_game_method
-    async def _restart_game(self, job_ctx=None):
-        print(
-            f"Restarting game for chat {self.chat_id}, stage: {self.stage}, paused: {self._paused}"
-        )
-        self.players.clear()
-        self.active_player_index = 0
-        self.stage = Stage.Bet
-        self._last_table = None
-        self._last_keyboard = None
+    async def _restart_game(self):
+        self.trace.debug("restart")
+        engine.reset(self.round)
+        self._edits = 0
+        self._lines.clear()  # ушедшие из-за стола не копятся
 
         await self.update_table(header="Открыта новая раздача!")
 
-        self.timer = self.ctx.job_queue.run_once(
-            self.end_bet,
-            when=BET_TIMEOUT,
-            chat_id=self.chat_id,
-            name=f"bj_end_bet_{self.chat_id}",
-        )
+        self.timers.schedule(self.chat_id, "bj_end_bet", BET_TIMEOUT, self.end_bet)
 
-    @safe_game_method
     async def update_table(self, header: str = None, footer: str = ""):
-        print(
-            f"Updating table for chat {self.chat_id}, stage: {self.stage}, paused: {self._paused}"
-        )
+        # стол только помечаем грязным: правка уйдёт одна на всю пачку
+        # изменений, не чаще раза в BJ_EDIT_INTERVAL и с последним
+        # состоянием. Заголовок-уведомление держим до ближайшей правки.
+        self.trace.debug("dirty", stage=self.stage.value, paused=self._paused)
+        header = header or (self._dirty[0] if self._dirty else None)
+        self._dirty = (header, footer)
+        if self._paused or self.timers.pending(self.chat_id, self._flush_timer):
+            # на паузе правки копятся, отрисует _recover
+            return
+        delay = self._last_edit + BJ_EDIT_INTERVAL - time.monotonic()
+        self.timers.schedule(self.chat_id, self._flush_timer, delay, self._flush_table)
+
+    @safe_game_method
+    async def _flush_table(self):
+        if self._dirty is None or self._paused:
+            return
+        header, footer = self._dirty
+        self._dirty = None
         table, keyboard = await self._build_table(header, footer)
         if table == self._last_table and keyboard == self._last_keyboard:
             return
-        self._last_table, self._last_keyboard = table, keyboard
+        self._last_edit = time.monotonic()
         try:
             if keyboard:
                 await self.ctx.bot.edit_message_text(
@@ -817,6 +658,8 @@ class BlackjackGame:
                     chat_id=self.chat_id,
                     message_id=self.msg_id,
                 )
+            self._last_table, self._last_keyboard = table, keyboard
+            self._edits += 1
         except RetryAfter as e:
             await self._pause_game(
                 e.retry_after,
@@ -826,27 +669,19 @@ class BlackjackGame:
             await self._pause_game(5, notice=(f"⚠️ Ошибка обновления"))
 
     def cleanup(self):
-        if self.timer:
-            try:
-                self.timer.schedule_removal()
-            except Exception as e:
-                print(f"Error cleanup: {e}")
+        # отложенная перерисовка остаётся: финальный стол ещё должен уйти
+        self.timers.cancel(self.chat_id, *STAGE_TIMERS, "bj_recover")
         self.ctx.application.bot_data["games"].pop(self.chat_id, None)
 
 
-async def dispatch_bet(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    game = context.application.bot_data.get("games", {}).get(update.effective_chat.id)
-    if game:
-        await game.handle_bet(update, context)
-
-
-async def dispatch_act(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    game = context.application.bot_data.get("games", {}).get(update.effective_chat.id)
-    if game:
-        await game.handle_action(update, context)
+# нажатия и команда запуска уходят в ящик актора чата
+dispatch_bet = game_handler(BlackjackGame, "handle_bet")
+dispatch_act = game_handler(BlackjackGame, "handle_action")
 
 
 def register_handlers(app):
-    app.add_handler(CommandHandler(list(HandlerBlackJack), BlackjackGame.start))
+    app.add_handler(
+        CommandHandler(list(HandlerBlackJack), game_command(BlackjackGame.start))
+    )
     app.add_handler(CallbackQueryHandler(dispatch_bet, pattern="^bj_bet_"))
     app.add_handler(CallbackQueryHandler(dispatch_act, pattern="^bj_act_"))
@@ -0,0 +1,436 @@
+import argparse
+import math
+import random
+import time
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Dict, List, Optional, Tuple, Union
+
+from config import FREE_MONEY
+from games.cards import Hand, Shoe
+from items import ITEMS, ItemId
+
+# Правила блэкджека без телеграма, базы и таймеров. Состояние стола — Round,
+# ставки, раздача, ходы и расчёт — синхронные функции, которые меняют раунд
+# и возвращают эффекты: доплаты, выигрыши, списания предметов, подсказки.
+# Проводит эффекты адаптер: bjack.py — через эскроу и сообщения, бенчмарк
+# ниже — просто суммирует.
+#
+# Бенчмарк: python -m games.bjengine --rounds 100000, тесты — tests/
+
+MAX_SPLITS = 3
+DEALER_STAND = 17  # дилер берёт до 17 и стоит на любых 17
+HOTCARD_HIGH = 0.6  # доля старших карт, с которой подсказка «горячая»
+
+ACTIONS = ("hit", "stand", "double", "split", "insurance", "escape", "hotcard")
+
+
+class Stage(Enum):
+    Bet = "bet"
+    Play = "play"
+    End = "end"
+    Close = "close"
+
+
+@dataclass
+class Player:
+    uid: int
+    name: str
+    hand: Hand = field(default_factory=Hand)
+    bet: int = 0
+    balance: int = 0
+    splitted: bool = False
+    escape: bool = False
+    insurance: bool = False
+    insurance_bet: int = 0
+    result: str = ""
+    loan: bool = False
+    # снимок инвентаря на время раунда: рендер и клавиатура не ходят в БД
+    items: Dict[str, int] = field(default_factory=dict)
+
+    def has_item(self, item_id: str) -> bool:
+        return self.items.get(str(item_id), 0) > 0
+
+
+@dataclass
+class Dealer:
+    hand: Hand = field(default_factory=Hand)
+
+
+@dataclass
+class Round:
+    players: List[Player] = field(default_factory=list)
+    dealer: Dealer = field(default_factory=Dealer)
+    shoe: Shoe = field(default_factory=Shoe)  # переживает раунды
+    active_player_index: int = 0
+    stage: Stage = Stage.Bet
+
+    @property
+    def active_player(self) -> Optional[Player]:
+        if self.active_player_index < len(self.players):
+            return self.players[self.active_player_index]
+        return None
+
+
+@dataclass(frozen=True)
+class Spend:  # доплата из кошелька раунда: удвоение, сплит, страховка
+    uid: int
+    amount: int
+
+
+@dataclass(frozen=True)
+class Credit:  # к зачислению при расчёте, вместе с возвратом ставки
+    uid: int
+    amount: int
+
+
+@dataclass(frozen=True)
+class UseItem:
+    uid: int
+    item_id: str
+
+
+@dataclass(frozen=True)
+class Profit:  # чистый итог руки для статистики сессии
+    uid: int
+    amount: int
+
+
+@dataclass(frozen=True)
+class Hint:  # ответ только нажавшему, стол не меняется
+    uid: int
+    text: str
+
+
+Effect = Union[Spend, Credit, UseItem, Profit, Hint]
+
+
+def reset(rnd: Round) -> None:
+    rnd.players.clear()
+    rnd.dealer = Dealer()
+    rnd.active_player_index = 0
+    rnd.stage = Stage.Bet
+
+
+def place_bet(
+    rnd: Round,
+    uid: int,
+    name: str,
+    balance: int,
+    items: Dict[str, int],
+    kind: str,
+    value: int = 0,
+) -> Optional[Tuple[str, bool]]:
+    # kind: "mz" — микрозайм, "pct" — процент баланса, иначе сумма value.
+    # Деньги не трогаем: списание одним разом при раздаче. Возвращает
+    # (ошибка, показать алертом) или None, если игрок сел за стол.
+    seated = next((p for p in rnd.players if p.uid == uid), None)
+    amount, loan = 0, False
+    if kind == "mz":
+        if balance >= FREE_MONEY:
+            return ("У тебя еще есть деньги", True)
+        amount, loan = FREE_MONEY, True
+    elif balance <= 0:
+        return ("Нет монеточек", True)
+    elif kind == "pct":
+        amount = balance * value // 100
+    else:
+        amount = value
+
+    if amount <= 0 or (not loan and amount > balance):
+        return ("Неверная ставка", True)
+    if seated and amount == seated.bet:
+        return ("Такая ставка уже сделана", False)
+
+    player = Player(
+        uid=uid,
+        name=name,
+        bet=amount,
+        balance=0 if loan else balance - amount,
+        loan=loan,
+        items=items,
+    )
+    if seated:
+        rnd.players[rnd.players.index(seated)] = player
+    else:
+        rnd.players.append(player)
+    return None
+
+
+def confirm_stakes(rnd: Round, balances: Dict[int, int]) -> List[Player]:
+    # balances — кошельки после списания ставок; кого в них нет, тот
+    # остаётся без раунда. Возвращает снятых со стола.
+    unseated = [p for p in rnd.players if p.uid not in balances]
+    rnd.players = [p for p in rnd.players if p.uid in balances]
+    for p in rnd.players:
+        p.balance = balances[p.uid]
+    return unseated
+
+
+def deal(rnd: Round) -> bool:
+    # True, если перед раздачей шуз перетасовали
+    shoe = rnd.shoe
+    shuffled = shoe.cut_reached
+    if shuffled:
+        shoe.shuffle()
+    rnd.stage = Stage.Play
+    rnd.active_player_index = 0
+    rnd.dealer.hand = Hand((shoe.draw(), shoe.draw()))
+    for p in rnd.players:
+        p.hand = Hand((shoe.draw(), shoe.draw()))
+    return shuffled
+
+
+def precheck(rnd: Round, act: str) -> Optional[str]:
+    # кошелёк и инвентарь раунда в памяти — всё проверяем до ответа
+    player = rnd.active_player
+    if act not in ACTIONS:
+        return "Неизвестное действие"
+    if act in ("hit", "stand"):
+        return None
+    if act == "hotcard":
+        if not player.has_item(ItemId.HotCard):
+            return f"У вас нет {ITEMS[ItemId.HotCard].name}."
+        return None
+    if len(player.hand) != 2:
+        return "Это можно сделать только с двумя картами"
+    if act == "double" and player.balance < player.bet:
+        return "Недостаточно средств для удвоения ставки"
+    if act == "split":
+        if not player.hand.can_split:
+            return "Невозможно разделить руки"
+        if splits_done(rnd, player.uid) >= MAX_SPLITS:
+            return "Больше делить нельзя"
+        if player.balance < player.bet:
+            return "Недостаточно средств для сплита"
+    if act == "insurance":
+        if player.insurance:
+            return "Страховка уже действует"
+        if not rnd.dealer.hand.first_is_ace:
+            return "Страховка доступна, только если у дилера туз"
+        if not player.has_item(ItemId.Insurance):
+            return "У вас нет страховки"
+        if player.balance < math.ceil(player.bet / 2):
+            return "Недостаточно средств для страховки"
+    if act == "escape":
+        if player.escape:
+            return "Вы уже сбежали"
+        if player.insurance:
+            return "Нельзя сбежать со страховкой"
+        if not player.has_item(ItemId.Escape):
+            return "У вас нет предмета Побег"
+    return None
+
+
+def cost(rnd: Round, act: str) -> int:
+    # доплата за ход: удвоение и сплит — ещё одна ставка, страховка — половина
+    player = rnd.active_player
+    if act in ("double", "split"):
+        return player.bet
+    if act == "insurance":
+        return math.ceil(player.bet / 2)
+    return 0
+
+
+def splits_done(rnd: Round, uid: int) -> int:
+    return sum(1 for p in rnd.players if p.uid == uid and p.splitted)
+
+
+def _spend(rnd: Round, uid: int, amount: int, effects: List[Effect]) -> None:
+    # кошелёк общий у всех рук игрока после сплита
+    effects.append(Spend(uid, amount))
+    for p in rnd.players:
+        if p.uid == uid:
+            p.balance -= amount
+
+
+def _use_item(rnd: Round, uid: int, item_id: str, effects: List[Effect]) -> None:
+    effects.append(UseItem(uid, str(item_id)))
+    for p in rnd.players:
+        if p.uid == uid:
+            left = p.items.get(str(item_id), 0) - 1
+            if left > 0:
+                p.items[str(item_id)] = left
+            else:
+                p.items.pop(str(item_id), None)
+
+
+def _hotcard_hint(shoe: Shoe, rng) -> str:
+    high, total = shoe.upcoming_high(rng.randint(4, 6))
+    if not total:
+        return "Недостаточно карт для анализа."
+    ratio = high / total
+    if ratio >= HOTCARD_HIGH:
+        return "🔥 Скорее всего впереди преимущественно старшие карты."
+    if ratio <= 1 - HOTCARD_HIGH:
+        return "❄️ Скорее всего впереди преимущественно младшие карты."
+    return "⚖️ Явного перевеса в ближайших картах не заметно."
+
+
+def step(rnd: Round, act: str, rng=random) -> List[Effect]:
+    # ход активной руки; проверки — в precheck, авто-«хватит» по таймеру
+    # тоже идёт сюда
+    player = rnd.active_player
+    shoe = rnd.shoe
+    effects: List[Effect] = []
+    if act == "hit":
+        player.hand.add(shoe.draw())
+        if player.hand.value > 21:
+            rnd.active_player_index += 1
+    elif act == "stand":
+        rnd.active_player_index += 1
+    elif act == "double":
+        _spend(rnd, player.uid, cost(rnd, act), effects)
+        player.bet *= 2
+        player.hand.add(shoe.draw())
+        rnd.active_player_index += 1
+    elif act == "split":
+        _spend(rnd, player.uid, cost(rnd, act), effects)
+        rnd.players.append(
+            Player(
+                uid=player.uid,
+                name=player.name + " (✂️)",
+                hand=Hand((player.hand.pop(), shoe.draw())),
+                bet=player.bet,
+                balance=player.balance,
+                splitted=True,
+                items=dict(player.items),
+            )
+        )
+        player.hand.add(shoe.draw())
+    elif act == "insurance":
+        insurance_bet = cost(rnd, act)
+        _spend(rnd, player.uid, insurance_bet, effects)
+        _use_item(rnd, player.uid, ItemId.Insurance, effects)
+        player.insurance = True
+        player.insurance_bet = insurance_bet
+    elif act == "escape":
+        _use_item(rnd, player.uid, ItemId.Escape, effects)
+        player.escape = True
+        rnd.active_player_index += 1
+    elif act == "hotcard":
+        _use_item(rnd, player.uid, ItemId.HotCard, effects)
+        effects.append(Hint(player.uid, _hotcard_hint(shoe, rng)))
+    return effects
+
+
+def finish(rnd: Round) -> List[Effect]:
+    dealer = rnd.dealer.hand
+    while dealer.value < DEALER_STAND:
+        dealer.add(rnd.shoe.draw())
+
+    dealer_val = dealer.value
+    dealer_nbj = dealer.is_blackjack
+    effects: List[Effect] = []
+    for player in rnd.players:
+        player_val = player.hand.value
+        player_bet = player.bet
+        player_nbj = player.hand.is_blackjack
+
+        if player.escape:
+            half_bet = math.ceil(player_bet / 2)
+            player.result = f"🏃 {player.name} Побег -{half_bet}"
+            effects += (Credit(player.uid, half_bet), Profit(player.uid, -half_bet))
+            continue
+
+        # закрытую карту дилер не проверяет: при его блэкджеке теряется
+        # всё поставленное, включая удвоения и сплиты
+        if player_val > 21 or (dealer_nbj and not player_nbj):
+            win = -player_bet
+        elif player_nbj and not dealer_nbj:
+            win = math.ceil(player_bet * 1.5)  # 3:2
+        elif dealer_val > 21 or player_val > dealer_val:
+            win = player_bet
+        elif player_val < dealer_val:
+            win = -player_bet
+        else:
+            win = 0
+
+        if win > 0:
+            res_str = f"💹 {player.name} +{player_bet + win}"
+        elif win < 0:
+            res_str = f"💀 {player.name} -{player_bet}"
+        else:
+            res_str = f"😐 {player.name} Ничья +{player_bet}"
+        if win >= 0:
+            effects.append(Credit(player.uid, player_bet + win))
+
+        if player.insurance:
+            if dealer_nbj:
+                insurance_win = player.insurance_bet * 3  # 2:1
+                win += player.insurance_bet * 2
+                effects.append(Credit(player.uid, insurance_win))
+                res_str += f" 🛡+{insurance_win}"
+            else:
+                win -= player.insurance_bet
+                res_str += f" 🛡-{player.insurance_bet}"
+
+        player.result = res_str
+        effects.append(Profit(player.uid, win))
+
+    rnd.stage = Stage.End
+    return effects
+
+
+def _autoplay(rnd: Round, rng) -> List[Effect]:
+    # бот для бенчмарка: сплитит пары, удваивает 10-11, берёт до 17
+    effects: List[Effect] = []
+    while rnd.active_player:
+        hand = rnd.active_player.hand
+        if precheck(rnd, "split") is None:
+            act = "split"
+        elif hand.value in (10, 11) and precheck(rnd, "double") is None:
+            act = "double"
+        elif hand.value < DEALER_STAND:
+            act = "hit"
+        else:
+            act = "stand"
+        effects += step(rnd, act, rng)
+    return effects + finish(rnd)
+
+
+def simulate(rounds: int, players: int = 4, rng=random) -> Tuple[int, int, int, int]:
+    # раунды ботов по 100 монет: (поставлено, доплачено, выплачено, итог)
+    rnd = Round()
+    staked = spent = credited = profit = 0
+    for _ in range(rounds):
+        reset(rnd)
+        for uid in range(players):
+            place_bet(rnd, uid, f"bot{uid}", 10_000, {}, "fix", 100)
+        confirm_stakes(rnd, {p.uid: p.balance for p in rnd.players})
+        staked += sum(p.bet for p in rnd.players)
+        deal(rnd)
+        for e in _autoplay(rnd, rng):
+            if isinstance(e, Spend):
+                spent += e.amount
+            elif isinstance(e, Credit):
+                credited += e.amount
+            elif isinstance(e, Profit):
+                profit += e.amount
+    return staked, spent, credited, profit
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Бенчмарк движка блэкджека")
+    parser.add_argument("--rounds", type=int, default=100_000)
+    parser.add_argument("--players", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    started = time.perf_counter()
+    staked, spent, credited, profit = simulate(
+        args.rounds, args.players, random.Random(args.seed)
+    )
+    elapsed = time.perf_counter() - started
+
+    # деньги сходятся: выплаты минус всё поставленное — итог по рукам
+    assert credited - staked - spent == profit, (credited, staked, spent, profit)
+    hands = args.rounds * args.players
+    print(f"раундов: {args.rounds:,}, рук: {hands:,}, {elapsed:.2f} с")
+    print(f"раундов/с: {args.rounds / elapsed:,.0f}")
+    print(f"итог игроков: {profit / (hands * 100):+.3%} ставки")
+
+
+if __name__ == "__main__":
+    main()
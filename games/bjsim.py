@@ -0,0 +1,371 @@
+import argparse
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from typing import Dict, List, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    raise SystemExit("Для симулятора нужен numpy: pip install numpy")
+
+from games.bjengine import DEALER_STAND, MAX_SPLITS
+from games.cards import CARD_RANK, CARD_VALUE, DECK
+
+# Монте-Карло симулятор блэкджека: python -m games.bjsim --rounds 20000000
+# Нужен numpy, в рантайм бота он не входит: pip install numpy
+#
+# Правила как в bjengine.py, шуз — одна колода, которую тасуют каждый
+# раунд (BJ_DECKS=1, BJ_PENETRATION=0), так что счёт карт не помогает; дилер
+# берёт до 17 и стоит на любых 17; закрытую карту дилер не проверяет, так
+# что при его блэкджеке игрок теряет всё поставленное, включая удвоения и
+# сплиты; натуральные 21 (две карты, в том числе после сплита) — 3:2 с
+# округлением вверх; до 3 сплитов, удвоение на любых двух картах;
+# страховка — половина ставки, платит 2:1; побег возвращает половину ставки
+# (округление вверх), то есть реальная потеря — floor(bet / 2).
+
+MAX_HANDS = MAX_SPLITS + 1
+BATCH = 200_000
+
+H, S, D, P, R, X = range(6)  # hit, stand, double, split, escape, double/stand
+CODES = {"H": H, "S": S, "D": D, "P": P, "R": R, "X": X}
+
+# базовая стратегия без подглядывания дилера: не удваиваем и не сплитим
+# против 10 и туза. Столбцы — открытая карта дилера 2..10, A.
+BASIC_HARD = {
+    9: "HDDDDHHHHH",
+    10: "DDDDDDDDHH",
+    11: "DDDDDDDDHH",
+    12: "HHSSSHHHHH",
+    13: "SSSSSHHHHH",
+    14: "SSSSSHHHHH",
+    15: "SSSSSHHHRH",
+    16: "SSSSSHHRRR",
+}
+BASIC_SOFT = {
+    13: "HHHDDHHHHH",
+    14: "HHHDDHHHHH",
+    15: "HHDDDHHHHH",
+    16: "HHDDDHHHHH",
+    17: "HDDDDHHHHH",
+    18: "SXXXXSSHHH",
+}
+BASIC_PAIRS = {  # по очкам карты пары
+    2: "PPPPPPHHHH",
+    3: "PPPPPPHHHH",
+    4: "HHHPPHHHHH",
+    5: "DDDDDDDDHH",
+    6: "PPPPPHHHHH",
+    7: "PPPPPPHHHH",
+    8: "PPPPPPPPHH",
+    9: "PPPPPSPPSS",
+    11: "PPPPPPPPPH",
+}
+
+
+@dataclass(frozen=True)
+class Strategy:
+    name: str
+    hard: Dict[int, str]
+    soft: Dict[int, str]
+    pairs: Dict[int, str]
+    stand_from: int = 17  # hard: дальше таблицы — стоять
+    insure: bool = False
+    escape: bool = False
+
+
+STRATEGIES = {
+    s.name: s
+    for s in (
+        Strategy("basic", BASIC_HARD, BASIC_SOFT, BASIC_PAIRS),
+        Strategy("basic+escape", BASIC_HARD, BASIC_SOFT, BASIC_PAIRS, escape=True),
+        Strategy("basic+insurance", BASIC_HARD, BASIC_SOFT, BASIC_PAIRS, insure=True),
+        Strategy("mimic", {}, {}, {}),
+        Strategy("never_bust", {}, {}, {}, stand_from=12),
+    )
+}
+
+
+def _table(rows: Dict[int, str], default) -> "np.ndarray":
+    # [очки 0..31, открытая карта 0..11] -> код действия
+    t = np.empty((32, 12), dtype=np.int8)
+    for total in range(32):
+        t[total, :] = default(total)
+        row = rows.get(total)
+        if row:
+            t[total, 2:12] = [CODES[ch] for ch in row]
+    return t
+
+
+def _tables(st: Strategy):
+    hard = _table(st.hard, lambda t: S if t >= st.stand_from else H)
+    soft = _table(st.soft, lambda t: S if t >= max(st.stand_from, 18) else H)
+    pairs = _table(st.pairs, lambda t: -1)
+    return hard, soft, pairs
+
+
+CARD_VALUE_NP = np.array(CARD_VALUE, dtype=np.int8)
+CARD_RANK_NP = np.array(CARD_RANK, dtype=np.int8)
+
+
+class Batch:
+    # ленивый Фишер–Йейтс: колода каждого раунда тасуется по мере раздачи,
+    # а раунду обычно хватает десятка карт из 52
+    def __init__(self, rng, n: int):
+        self.rng = rng
+        self.deck = np.broadcast_to(
+            np.arange(len(DECK), dtype=np.int8), (n, len(DECK))
+        ).copy()
+        self.ptr = np.zeros(n, dtype=np.intp)
+        self.n = n
+
+    def draw(self, lanes):
+        i = self.ptr[lanes]
+        j = i + (self.rng.random(lanes.size) * (len(DECK) - i)).astype(np.intp)
+        card = self.deck[lanes, j]
+        self.deck[lanes, j] = self.deck[lanes, i]
+        self.ptr[lanes] = i + 1
+        return CARD_VALUE_NP[card], CARD_RANK_NP[card]
+
+
+def _add(total, soft, value):
+    total = total + value
+    soft = soft + (value == 11)
+    for _ in range(2):
+        fix = (total > 21) & (soft > 0)
+        total = total - 10 * fix
+        soft = soft - fix
+    return total, soft
+
+
+def simulate(strategy: str, rounds: int, bet: int, seed) -> Tuple[int, float, float]:
+    st = STRATEGIES[strategy]
+    hard_t, soft_t, pair_t = _tables(st)
+    rng = np.random.default_rng(seed)
+    n_total, s1, s2 = 0, 0.0, 0.0
+    while n_total < rounds:
+        n = min(BATCH, rounds - n_total)
+        net = _play_batch(Batch(rng, n), st, hard_t, soft_t, pair_t, bet)
+        units = net / bet
+        n_total += n
+        s1 += float(units.sum())
+        s2 += float((units * units).sum())
+    return n_total, s1, s2
+
+
+def _play_batch(b: Batch, st: Strategy, hard_t, soft_t, pair_t, bet: int):
+    n = b.n
+    lanes_all = np.arange(n)
+
+    d_up, _ = b.draw(lanes_all)
+    d_hole, _ = b.draw(lanes_all)
+    up = d_up.astype(np.intp)
+    d_total, d_soft = _add(np.zeros(n, np.int16), np.zeros(n, np.int16), d_up)
+    d_total, d_soft = _add(d_total, d_soft, d_hole)
+    dealer_nbj = d_total == 21
+
+    shape = (n, MAX_HANDS)
+    total = np.zeros(shape, np.int16)
+    soft = np.zeros(shape, np.int16)
+    ncards = np.zeros(shape, np.int8)
+    r1 = np.zeros(shape, np.int8)
+    r2 = np.zeros(shape, np.int8)
+    v2 = np.zeros(shape, np.int8)
+    stake = np.zeros(shape, np.int64)
+    escaped = np.zeros(shape, bool)
+    nhands = np.ones(n, np.intp)
+    splits = np.zeros(n, np.int8)
+
+    for k in range(2):
+        v, r = b.draw(lanes_all)
+        total[:, 0], soft[:, 0] = _add(total[:, 0], soft[:, 0], v)
+        (r1 if k == 0 else r2)[:, 0] = r
+        if k == 1:
+            v2[:, 0] = v
+    ncards[:, 0] = 2
+    stake[:, 0] = bet
+
+    insured = np.zeros(n, bool)
+    ins_bet = math.ceil(bet / 2)
+    if st.insure:
+        insured = up == 11
+
+    for h in range(MAX_HANDS):
+        active = nhands > h
+        while True:
+            lanes = np.flatnonzero(active)
+            if not lanes.size:
+                break
+            t, sf, nc = total[lanes, h], soft[lanes, h], ncards[lanes, h]
+            u = up[lanes]
+            code = np.where(sf > 0, soft_t[t, u], hard_t[t, u])
+            pair = (
+                (nc == 2)
+                & (r1[lanes, h] == r2[lanes, h])
+                & (splits[lanes] < MAX_SPLITS)
+            )
+            pcode = pair_t[np.where(pair, v2[lanes, h], 0), u]
+            code = np.where(pair & (pcode >= 0), pcode, code)
+            two = nc == 2
+            code = np.where((code == D) & ~two, H, code)
+            code = np.where((code == X) & ~two, S, np.where(code == X, D, code))
+            can_escape = st.escape & two & ~insured[lanes]
+            code = np.where((code == R) & ~can_escape, H, code)
+            code = np.where(t >= 21, S, code)
+
+            done = np.zeros(lanes.size, bool)
+
+            m = code == S
+            done |= m
+
+            m = code == R
+            escaped[lanes[m], h] = True
+            done |= m
+
+            m = code == D
+            if m.any():
+                ln = lanes[m]
+                stake[ln, h] *= 2
+                v, _ = b.draw(ln)
+                total[ln, h], soft[ln, h] = _add(total[ln, h], soft[ln, h], v)
+                ncards[ln, h] += 1
+                done |= m
+
+            m = code == P
+            if m.any():
+                ln = lanes[m]
+                k = nhands[ln]
+                nhands[ln] += 1
+                splits[ln] += 1
+                moved_v, moved_r = v2[ln, h], r2[ln, h]
+                # как в игре: новая рука получает карту первой
+                v, r = b.draw(ln)
+                total[ln, k], soft[ln, k] = _add(
+                    np.zeros(ln.size, np.int16), np.zeros(ln.size, np.int16), moved_v
+                )
+                total[ln, k], soft[ln, k] = _add(total[ln, k], soft[ln, k], v)
+                r1[ln, k], r2[ln, k], v2[ln, k] = moved_r, r, v
+                ncards[ln, k] = 2
+                stake[ln, k] = stake[ln, h]
+                # у пары одинаковый ранг, так что оставшаяся карта стоит столько же
+                v, r = b.draw(ln)
+                total[ln, h], soft[ln, h] = _add(
+                    np.zeros(ln.size, np.int16), np.zeros(ln.size, np.int16), moved_v
+                )
+                total[ln, h], soft[ln, h] = _add(total[ln, h], soft[ln, h], v)
+                r2[ln, h], v2[ln, h] = r, v
+                ncards[ln, h] = 2
+
+            m = code == H
+            if m.any():
+                ln = lanes[m]
+                v, _ = b.draw(ln)
+                total[ln, h], soft[ln, h] = _add(total[ln, h], soft[ln, h], v)
+                ncards[ln, h] += 1
+                done[m] = total[ln, h] > 21
+
+            active[lanes[done]] = False
+
+    # дилер добирает до 17 (стоит и на мягких 17)
+    while True:
+        lanes = np.flatnonzero(d_total < DEALER_STAND)
+        if not lanes.size:
+            break
+        v, _ = b.draw(lanes)
+        d_total[lanes], d_soft[lanes] = _add(d_total[lanes], d_soft[lanes], v)
+
+    net = np.zeros(n, np.int64)
+    for h in range(MAX_HANDS):
+        exists = nhands > h
+        t, sk = total[:, h], stake[:, h]
+        nbj = (t == 21) & (ncards[:, h] == 2)
+        res = np.select(
+            [
+                escaped[:, h],
+                t > 21,
+                dealer_nbj & ~nbj,
+                nbj & ~dealer_nbj,
+                d_total > 21,
+                t > d_total,
+                t < d_total,
+            ],
+            [
+                -(sk - (sk + 1) // 2),
+                -sk,
+                -sk,
+                (3 * sk + 1) // 2,
+                sk,
+                sk,
+                -sk,
+            ],
+            default=0,
+        )
+        net += np.where(exists, res, 0)
+    net += np.where(insured, np.where(dealer_nbj, 2 * ins_bet, -ins_bet), 0)
+    return net
+
+
+def _split_seeds(seed: int, parts: int):
+    return np.random.SeedSequence(seed).spawn(parts)
+
+
+def run(strategies: List[str], rounds: int, workers: int, bet: int, seed: int):
+    chunk = max(BATCH, rounds // (workers * 4) or 1)
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        for name in strategies:
+            sizes = [chunk] * (rounds // chunk) + (
+                [rounds % chunk] if rounds % chunk else []
+            )
+            seeds = _split_seeds(seed, len(sizes))
+            started = time.perf_counter()
+            parts = list(
+                pool.map(
+                    simulate, [name] * len(sizes), sizes, [bet] * len(sizes), seeds
+                )
+            )
+            elapsed = time.perf_counter() - started
+            n = sum(p[0] for p in parts)
+            s1 = sum(p[1] for p in parts)
+            s2 = sum(p[2] for p in parts)
+            mean = s1 / n
+            var = s2 / n - mean * mean
+            results[name] = (n, mean, var, elapsed)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Монте-Карло симулятор блэкджека")
+    parser.add_argument("--rounds", type=int, default=10_000_000)
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--bet", type=int, default=100)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--strategy",
+        action="append",
+        choices=sorted(STRATEGIES),
+        help="можно несколько раз; по умолчанию все",
+    )
+    args = parser.parse_args()
+
+    results = run(
+        args.strategy or list(STRATEGIES),
+        args.rounds,
+        args.workers,
+        args.bet,
+        args.seed,
+    )
+    print(
+        f"{'стратегия':<18}{'EV, % ставки':>14}{'± 95%':>10}{'дисперсия':>12}{'раундов/с':>14}"
+    )
+    for name, (n, mean, var, elapsed) in results.items():
+        ci = 1.96 * math.sqrt(var / n)
+        print(
+            f"{name:<18}{mean * 100:>14.3f}{ci * 100:>10.3f}{var:>12.3f}{n / elapsed:>14,.0f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
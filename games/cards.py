@@ -0,0 +1,133 @@
+import random
+from itertools import accumulate
+from typing import Iterable, List, Tuple
+
+# Карта — целое rank * 4 + suit (0..51), ранги от двойки до туза. Очки,
+# ранг и строка карты берутся из таблиц по индексу, строки нужны только
+# при отрисовке стола.
+
+RANKS = ["2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K", "A"]
+SUITS = ["♠", "♥", "♦", "♣"]
+
+ACE = 12
+TEN = 8  # индекс ранга «10»: от него и выше карты «старшие»
+
+DECK = tuple(range(len(RANKS) * len(SUITS)))
+CARD_RANK = tuple(c >> 2 for c in DECK)
+CARD_STR = tuple(RANKS[c >> 2] + SUITS[c & 3] for c in DECK)
+CARD_VALUE = tuple(11 if r == ACE else 10 if r >= TEN else r + 2 for r in CARD_RANK)
+CARD_HIGH = tuple(r >= TEN for r in CARD_RANK)
+
+
+class Shoe:
+    # N колод, живёт между раундами. Карта отсечки стоит на доле
+    # penetration: дошли до неё — тасуем перед следующей раздачей. Остаток
+    # по рангам и префиксные суммы старших карт в порядке раздачи отвечают
+    # на вопросы о шузе за O(1), без прохода по картам.
+    __slots__ = ("decks", "penetration", "cards", "pos", "cut", "counts", "highs")
+
+    def __init__(self, decks: int = 1, penetration: float = 0.75):
+        self.decks = decks
+        self.penetration = penetration
+        self.shuffle()
+
+    def shuffle(self) -> None:
+        cards = list(DECK) * self.decks
+        random.shuffle(cards)
+        self.cards = cards
+        self.pos = 0
+        self.cut = int(len(cards) * self.penetration)
+        self.counts = [len(SUITS) * self.decks] * len(RANKS)
+        self.highs = [0, *accumulate(CARD_HIGH[c] for c in cards)]
+
+    @property
+    def cut_reached(self) -> bool:
+        return self.pos >= self.cut
+
+    def draw(self) -> int:
+        if self.pos == len(self.cards):
+            # раунд не уместился в шуз — тасуем всё заново прямо посреди раздачи
+            self.shuffle()
+        card = self.cards[self.pos]
+        self.pos += 1
+        self.counts[CARD_RANK[card]] -= 1
+        return card
+
+    def upcoming_high(self, n: int) -> Tuple[int, int]:
+        # сколько старших среди n следующих карт и сколько карт реально есть
+        end = min(self.pos + n, len(self.cards))
+        return self.highs[end] - self.highs[self.pos], end - self.pos
+
+    def __len__(self) -> int:
+        return len(self.cards) - self.pos
+
+
+def render(cards: Iterable[int]) -> str:
+    return " ".join(CARD_STR[c] for c in cards)
+
+
+class Hand:
+    # сумма и число тузов, считаемых за 11, обновляются при каждой карте;
+    # строка руки рисуется один раз и живёт до следующей карты
+    __slots__ = ("cards", "total", "soft", "_text")
+
+    def __init__(self, cards: Iterable[int] = ()):
+        self.cards: List[int] = []
+        self.total = 0
+        self.soft = 0
+        self._text = None
+        for c in cards:
+            self.add(c)
+
+    def add(self, card: int) -> None:
+        self.cards.append(card)
+        self._text = None
+        self.total += CARD_VALUE[card]
+        if CARD_RANK[card] == ACE:
+            self.soft += 1
+        while self.total > 21 and self.soft:
+            self.total -= 10
+            self.soft -= 1
+
+    def pop(self) -> int:
+        # только для сплита, в руке остаётся одна карта
+        card = self.cards.pop()
+        rest = self.cards
+        self.cards, self.total, self.soft, self._text = [], 0, 0, None
+        for c in rest:
+            self.add(c)
+        return card
+
+    @property
+    def value(self) -> int:
+        return self.total
+
+    @property
+    def is_blackjack(self) -> bool:
+        return self.total == 21 and len(self.cards) == 2
+
+    @property
+    def can_split(self) -> bool:
+        cards = self.cards
+        return len(cards) == 2 and CARD_RANK[cards[0]] == CARD_RANK[cards[1]]
+
+    @property
+    def first_is_ace(self) -> bool:
+        return bool(self.cards) and CARD_RANK[self.cards[0]] == ACE
+
+    def __len__(self) -> int:
+        return len(self.cards)
+
+    def __iter__(self):
+        return iter(self.cards)
+
+    def __getitem__(self, i):
+        return self.cards[i]
+
+    def __str__(self) -> str:
+        if self._text is None:
+            self._text = render(self.cards)
+        return self._text
+
+    def __repr__(self) -> str:
+        return f"Hand({self})"
@@ -0,0 +1,117 @@
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from sqlalchemy import bindparam, delete, select
+from sqlalchemy.dialects.sqlite import insert
+
+from config import RECOVER_BATCH
+from db import SessionLocal
+from models import GameCheckpointModel, PlayerModel
+from tenancy import BOT_NS
+
+# Живые игры — только объекты в bot_data["games"], а ставки раунда к этому
+# моменту уже сняты с балансов. Поэтому на каждой смене стадии игра пишет
+# компактный снимок (одна строка на чат, JSON) в той же транзакции, что и
+# деньги: удержание ставок и снимок с ними коммитятся вместе, расчёт и
+# снимок без них — тоже. После рестарта recover() пачками по RECOVER_BATCH
+# возвращает удержанное (один executemany на пачку) и отдаёт снимки играм,
+# чтобы те поднялись заново или закрыли свои сообщения. Воркер шардинга
+# поднимает только свои чаты (owns), иначе каждый вернул бы ставки и
+# поднял бы все столы пространства.
+#
+# Формат data — дело игры; общий только ключ "holds": [[uid, сумма], ...],
+# то, что снято с балансов и ещё не рассчитано.
+
+Snapshot = Dict[str, object]
+
+_players = PlayerModel.__table__
+_rows = GameCheckpointModel.__table__
+
+
+def save(session, chat_id: int, game: str, stage: str, data: Snapshot) -> None:
+    stmt = insert(GameCheckpointModel).values(
+        bot_ns=BOT_NS.get(), chat_id=chat_id, game=game, stage=stage, data=data
+    )
+    session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=["bot_ns", "chat_id"],
+            set_={
+                "game": stmt.excluded.game,
+                "stage": stmt.excluded.stage,
+                "data": stmt.excluded.data,
+            },
+        )
+    )
+
+
+def drop(session, chat_id: int) -> None:
+    session.execute(
+        delete(GameCheckpointModel).where(
+            GameCheckpointModel.bot_ns == BOT_NS.get(),
+            GameCheckpointModel.chat_id == chat_id,
+        )
+    )
+
+
+def recover(
+    ns: str,
+    batch: int = RECOVER_BATCH,
+    owns: Optional[Callable[[int], bool]] = None,
+) -> List[Tuple[int, str, Snapshot]]:
+    # возвращает (чат, игра, снимок) игр ns, чьи чаты owns; в снимке
+    # holds — то, что сейчас вернули на балансы, а в самой строке они уже
+    # обнулены, так что повторный рестарт второй раз ничего не вернёт
+    refund = (
+        _players.update()
+        .where(
+            _players.c.bot_ns == ns,
+            _players.c.room_id == bindparam("chat"),
+            _players.c.tg_id == bindparam("uid"),
+        )
+        .values(balance=_players.c.balance + bindparam("amount"))
+    )
+    settled = (
+        _rows.update()
+        .where(_rows.c.bot_ns == ns, _rows.c.chat_id == bindparam("chat"))
+        .values(data=bindparam("snap"))
+    )
+
+    started = time.monotonic()
+    restored, refunded, last = [], 0, None
+    while True:
+        with SessionLocal() as s:
+            q = (
+                select(_rows.c.chat_id, _rows.c.game, _rows.c.data)
+                .where(_rows.c.bot_ns == ns)
+                .order_by(_rows.c.chat_id)
+                .limit(batch)
+            )
+            if last is not None:
+                q = q.where(_rows.c.chat_id > last)
+            rows = s.execute(q).all()
+            if not rows:
+                break
+            holds, cleared = [], []
+            for chat_id, game, data in rows:
+                if owns is not None and not owns(chat_id):
+                    continue
+                if data.get("holds"):
+                    holds += [
+                        {"chat": chat_id, "uid": uid, "amount": amount}
+                        for uid, amount in data["holds"]
+                    ]
+                    cleared.append({"chat": chat_id, "snap": {**data, "holds": []}})
+                restored.append((chat_id, game, data))
+            if holds:
+                s.execute(refund, holds)
+                s.execute(settled, cleared)
+                refunded += len(cleared)
+            s.commit()
+        last = rows[-1][0]
+
+    if restored:
+        print(
+            f"Чекпоинты: {len(restored)} игр, ставки возвращены в {refunded} "
+            f"за {time.monotonic() - started:.2f} с"
+        )
+    return restored
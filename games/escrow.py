@@ -0,0 +1,145 @@
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List
+
+from sqlalchemy import select, update
+
+from config import FREE_MONEY
+from items import change_item_amount
+from models import PlayerModel
+from tenancy import BOT_NS
+
+# Кошелёк раунда. Ставки списываются с баланса условным UPDATE на старте
+# раунда. Доплаты (удвоения, сплиты, страховка) списываются сразу, в момент
+# хода, таким же условным UPDATE и своей транзакцией: баланс в памяти стола
+# мог устареть, пока игрок крутил слоты, а в минус при расчёте не уйти.
+# Раунд без доплат — по-прежнему два коммита, каждая доплата добавляет
+# один. Выигрыши и предметы копятся в памяти и проводятся одной транзакцией
+# при расчёте. Если раунд упал — удержанное, вместе с доплатами,
+# возвращается одной транзакцией.
+
+
+@dataclass
+class Hold:
+    uid: int
+    stake: int  # ставка на столе
+    loan: bool = False  # микрозайм: ставка FREE_MONEY, баланс обнуляется
+    held: int = 0  # реально снято с баланса: ставка и доплаты
+    won: int = 0  # к зачислению при расчёте
+    used: Counter = field(default_factory=Counter)
+
+
+class RoundEscrow:
+    def __init__(self, chat_id: int):
+        self.chat_id = chat_id
+        self.holds: Dict[int, Hold] = {}
+        self._staged: Dict[int, Hold] = {}
+
+    def _players(self, uids: Iterable[int]):
+        return (
+            PlayerModel.room_id == self.chat_id,
+            PlayerModel.bot_ns == BOT_NS.get(),
+            PlayerModel.tg_id.in_(list(uids)),
+        )
+
+    def hold(self, session, stakes: Dict[int, int], loans=()) -> Dict[int, int]:
+        # условное списание: не хватило денег (потратил на слоты, пока шли
+        # ставки) — игрок просто не попадает в раунд. Возвращает балансы
+        # после списания для тех, кто попал.
+        for uid, stake in stakes.items():
+            loan = uid in loans
+            cond = (
+                PlayerModel.balance < FREE_MONEY
+                if loan
+                else PlayerModel.balance >= stake
+            )
+            held = stake
+            if loan:
+                held = session.execute(
+                    select(PlayerModel.balance).where(*self._players([uid]), cond)
+                ).scalar()
+                if held is None:
+                    continue
+            res = session.execute(
+                update(PlayerModel)
+                .where(*self._players([uid]), cond)
+                .values(balance=PlayerModel.balance - held)
+            )
+            if res.rowcount:
+                self._staged[uid] = Hold(uid, stake, loan, held)
+        if not self._staged:
+            return {}
+        return dict(
+            session.execute(
+                select(PlayerModel.tg_id, PlayerModel.balance).where(
+                    *self._players(self._staged)
+                )
+            ).all()
+        )
+
+    def confirm(self) -> None:
+        # после коммита hold: до него откатывать нечего
+        self.holds, self._staged = self._staged, {}
+
+    def snapshot(self) -> List[List[int]]:
+        # снятое с балансов, включая ещё не подтверждённое: снимок игры
+        # пишется в той же транзакции, что и hold
+        holds = {**self.holds, **self._staged}
+        return [[uid, h.held] for uid, h in holds.items() if h.held]
+
+    def spend(self, session, uid: int, amount: int) -> bool:
+        # False — денег на балансе уже нет, ход не делаем
+        res = session.execute(
+            update(PlayerModel)
+            .where(*self._players([uid]), PlayerModel.balance >= amount)
+            .values(balance=PlayerModel.balance - amount)
+        )
+        if not res.rowcount:
+            return False
+        self.holds[uid].held += amount
+        return True
+
+    def credit(self, uid: int, amount: int) -> None:
+        self.holds[uid].won += amount
+
+    def use_item(self, uid: int, item_id: str) -> None:
+        self.holds[uid].used[str(item_id)] += 1
+
+    def settle(self, session) -> None:
+        # всё поставленное уже снято с балансов, остаётся только зачислить
+        for uid, h in self.holds.items():
+            if h.won:
+                session.execute(
+                    update(PlayerModel)
+                    .where(*self._players([uid]))
+                    .values(balance=PlayerModel.balance + h.won)
+                )
+        used = [h for h in self.holds.values() if h.used]
+        if used:
+            rows = session.execute(
+                select(PlayerModel).where(*self._players(h.uid for h in used))
+            ).scalars()
+            by_uid = {p.tg_id: p for p in rows}
+            for h in used:
+                p = by_uid.get(h.uid)
+                for item_id, qty in h.used.items():
+                    have = (p.items or {}).get(item_id, 0) if p else 0
+                    if have:
+                        change_item_amount(p, item_id, -min(qty, have))
+
+    def release(self, session) -> List[int]:
+        refunded = []
+        for uid, h in self.holds.items():
+            if h.held:
+                session.execute(
+                    update(PlayerModel)
+                    .where(*self._players([uid]))
+                    .values(balance=PlayerModel.balance + h.held)
+                )
+                refunded.append(uid)
+        return refunded
+
+    def clear(self) -> None:
+        # после коммита settle/release
+        self.holds.clear()
+        self._staged.clear()
@@ -1,8 +1,14 @@
+from functools import partial
+
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 from events import EventManager
 from config import FREE_MONEY
 from db import SessionLocal, get_player, get_player_by_id
+import outbox
+from actors import game_command, game_handler
+from games import checkpoint
+from callbacks import early_ack, follow_up
 
 GESTURES = {
     "rock": "✊",
@@ -44,28 +50,46 @@ class RPSGame:
         )
         msg = await update.message.reply_text(text, reply_markup=cls._rps_keyboard())
 
-        job = context.job_queue.run_once(
-            cls._rps_timeout, when=cls.TIMEOUT, data=chat_id
+        context.application.bot_data["timers"].schedule(
+            chat_id,
+            "rps_timeout",
+            cls.TIMEOUT,
+            partial(cls._rps_timeout, context, chat_id),
         )
         context.bot_data.setdefault("games", {})[chat_id] = cls(
             chat_id=chat_id,
             msg_id=msg.message_id,
             initiator_id=user.id,
             stake=stake,
-            job=job,
         )
+        # деньги RPS списываются только в finish, снимок нужен ради сообщения
+        with SessionLocal() as db:
+            checkpoint.save(db, chat_id, "rps", "play", {"msg": msg.message_id})
+            db.commit()
 
     @classmethod
-    async def handle_callback(cls, update, context: ContextTypes.DEFAULT_TYPE):
+    def abort(cls, context: ContextTypes.DEFAULT_TYPE, chat_id: int, data):
+        # игра из чекпоинта после рестарта: жесты потеряны, закрываем кнопки
+        box = context.application.bot_data["outbox"]
+        with SessionLocal() as db:
+            box.stage(
+                db,
+                outbox.edit(
+                    chat_id,
+                    data["msg"],
+                    "🎮 Игра прервана перезапуском бота, монеты не списывались.",
+                ),
+            )
+            checkpoint.drop(db, chat_id)
+            db.commit()
+
+    async def handle_callback(self, update, context: ContextTypes.DEFAULT_TYPE):
+        # вызывает актор чата, уже убедившись, что в чате идёт эта игра
         q = update.callback_query
         data = q.data
         chat_id = q.message.chat.id
         user = q.from_user
 
-        game = context.bot_data.get("games", {}).get(chat_id)
-        if not game:
-            return await q.answer("Игра уже завершена", show_alert=True)
-
         if data.startswith("rps_play_"):
 
             mgr: EventManager = context.application.bot_data.get("mgr")
@@ -74,44 +98,45 @@ class RPSGame:
                     "🚧 Ты участвуешь в ивенте — не можешь играть", show_alert=True
                 )
 
+            gesture = data.split("_")[-1]
+            if gesture not in GESTURES:
+                return await q.answer("Неизвестный жест", show_alert=True)
+            await early_ack(q, f"Вы выбрали {GESTURES[gesture]}")
+
             with SessionLocal() as db:
                 p = get_player(db, user.id, chat_id, user.first_name)
-                if p.balance < game.stake:
-                    return await q.answer(
-                        "Недостаточно монет для участия", show_alert=True
-                    )
+            if p.balance < self.stake:
+                return follow_up(
+                    context, chat_id, user, "Недостаточно монет для участия"
+                )
 
-            gesture = data.split("_")[-1]
-            first_time = not game.is_participant(user.id)
-            game.record(user.id, user.first_name, gesture)
-            await q.answer(f"Вы выбрали {GESTURES[gesture]}")
+            first_time = not self.is_participant(user.id)
+            self.record(user.id, user.first_name, gesture)
 
             if first_time:
                 try:
                     await context.bot.edit_message_text(
                         chat_id=chat_id,
-                        message_id=game.message_id,
-                        text=game.summary(),
-                        reply_markup=cls._rps_keyboard(),
+                        message_id=self.message_id,
+                        text=self.summary(),
+                        reply_markup=self._rps_keyboard(),
                     )
                 except Exception:
                     pass
             return
 
         if data == "rps_end":
-            if user.id != game.initiator_id:
+            if user.id != self.initiator_id:
                 return await q.answer(
                     "Только инициатор может завершить игру", show_alert=True
                 )
             await q.answer("Завершаю игру…")
-            await game.finish(context, reason="по инициативе")
+            await self.finish(context, reason="по инициативе")
 
     @classmethod
-    async def _rps_timeout(cls, context: ContextTypes.DEFAULT_TYPE):
-        job = context.job
-        chat_id = job.data
+    async def _rps_timeout(cls, context: ContextTypes.DEFAULT_TYPE, chat_id: int):
         game = context.bot_data.get("games", {}).get(chat_id)
-        if game:
+        if isinstance(game, cls):
             await game.finish(context, reason="таймаут")
 
     @staticmethod
@@ -123,13 +148,12 @@ class RPSGame:
         finish = [InlineKeyboardButton("🏁 Завершить игру", callback_data="rps_end")]
         return InlineKeyboardMarkup([row, finish])
 
-    def __init__(self, chat_id: int, msg_id: int, initiator_id: int, stake: int, job):
+    def __init__(self, chat_id: int, msg_id: int, initiator_id: int, stake: int):
         self.chat_id = chat_id
         self.message_id = msg_id
         self.initiator_id = initiator_id
         self.stake = stake
         self.participants = {}  # user_id -> {'name': ..., 'gesture': ...}
-        self.job = job
 
     def is_participant(self, user_id: int) -> bool:
         return user_id in self.participants
@@ -162,32 +186,25 @@ class RPSGame:
         return winners, losers
 
     async def finish(self, context: ContextTypes.DEFAULT_TYPE, reason: str):
-        try:
-            self.job.schedule_removal()
-        except Exception:
-            pass
+        context.application.bot_data["timers"].cancel(self.chat_id, "rps_timeout")
 
         header = ["👀 Жесты игроков:"]
         for info in self.participants.values():
             header.append(f"• {info['name']}: {GESTURES[info['gesture']]}")
 
         res = self.compute_result()
+        box = context.application.bot_data["outbox"]
         if res is None:
             text = "\n".join(header + [f"\nНичья ({reason}), ставки возвращаются."])
+            with SessionLocal() as db:
+                box.stage(db, outbox.edit(self.chat_id, self.message_id, text))
+                checkpoint.drop(db, self.chat_id)
+                db.commit()
         else:
             winners, losers = res
             bank = len(losers) * self.stake
             share = -(-bank // len(winners))
 
-            with SessionLocal() as db:
-                for uid in losers:
-                    p = get_player_by_id(db, uid, self.chat_id)
-                    p.balance -= self.stake
-                for uid in winners:
-                    p = get_player_by_id(db, uid, self.chat_id)
-                    p.balance += share
-                db.commit()
-
             names_w = [self.participants[uid]["name"] for uid in winners]
             names_l = [self.participants[uid]["name"] for uid in losers]
             footer = [
@@ -197,7 +214,20 @@ class RPSGame:
             ]
             text = "\n".join(header + footer)
 
-        await context.bot.edit_message_text(
-            chat_id=self.chat_id, message_id=self.message_id, text=text
-        )
+            with SessionLocal() as db:
+                for uid in losers:
+                    p = get_player_by_id(db, uid, self.chat_id)
+                    p.balance -= self.stake
+                for uid in winners:
+                    p = get_player_by_id(db, uid, self.chat_id)
+                    p.balance += share
+                box.stage(db, outbox.edit(self.chat_id, self.message_id, text))
+                checkpoint.drop(db, self.chat_id)
+                db.commit()
+
         context.bot_data.get("games", {}).pop(self.chat_id, None)
+
+
+# точки входа для хендлеров PTB: команда и кнопки — через актор чата
+dispatch_start = game_command(RPSGame.start_game)
+dispatch_callback = game_handler(RPSGame, "handle_callback")
@@ -30,3 +30,4 @@ HandlerShop = CommandAliases(long="shop", short="sh")
 HandlerBuy = CommandAliases(long="buy", short="b")
 HandlerUse = CommandAliases(long="use", short="u")
 HandlerWiki = CommandAliases(long="wiki", short=("w"))
+HandlerReloadItems = CommandAliases(long="reload_items", short="")
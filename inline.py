@@ -0,0 +1,103 @@
+from functools import lru_cache
+from typing import List, Tuple
+
+from telegram import InlineQueryResultArticle, InputTextMessageContent, Update
+from telegram.ext import ContextTypes, InlineQueryHandler
+
+from config import INLINE_CACHE_TIME
+from items import SHOP_ITEMS, on_reload, shop_item_text, shop_text
+from wiki import WIKI_DATA
+
+# Инлайн-режим: «@bot split» в любом чате. Все ответы — статьи из вики и
+# витрины магазина — собраны один раз при импорте, на запрос только
+# фильтруем. Результаты общие для всех, так что Telegram кэширует их у себя
+# на INLINE_CACHE_TIME и повторные запросы до нас не доходят.
+# Инлайн-режим нужно включить у @BotFather (/setinline).
+
+MAX_RESULTS = 50  # лимит Bot API на один ответ
+
+Entry = Tuple[Tuple[str, ...], InlineQueryResultArticle]
+
+
+def _title(text: str) -> str:
+    return next(line for line in text.splitlines() if line.strip()).strip(" ♠️♥️♦️♣️")
+
+
+def _article(
+    result_id: str, title: str, description: str, text: str
+) -> InlineQueryResultArticle:
+    return InlineQueryResultArticle(
+        id=result_id,
+        title=title,
+        description=description,
+        input_message_content=InputTextMessageContent(text),
+    )
+
+
+def _build_entries() -> List[Entry]:
+    entries: List[Entry] = []
+    for keys, desc in WIKI_DATA.items():
+        aliases = tuple(k.lower() for k in keys if k)
+        title = _title(desc)
+        entries.append(
+            (
+                aliases + (title.lower(),),
+                _article(f"wiki:{aliases[0]}", title, ", ".join(aliases), desc),
+            )
+        )
+
+    entries.append(
+        (
+            ("shop", "магазин"),
+            _article("shop", "🛍 Магазин", "Все товары и цены", shop_text()),
+        )
+    )
+    for it in SHOP_ITEMS.values():
+        entries.append(
+            (
+                (it.id.lower(), it.id_short_name.lower(), it.name.lower(), "shop"),
+                _article(
+                    f"shop:{it.id}",
+                    it.name,
+                    f"{it.price} монет",
+                    shop_item_text(it),
+                ),
+            )
+        )
+    return entries
+
+
+ENTRIES = _build_entries()
+
+
+@on_reload
+def _rebuild_entries() -> None:
+    # витрина из перезагруженного реестра; ответы Telegram держит у себя
+    # ещё до INLINE_CACHE_TIME
+    global ENTRIES
+    ENTRIES = _build_entries()
+    search.cache_clear()
+
+
+@lru_cache(maxsize=1024)
+def search(q: str) -> Tuple[InlineQueryResultArticle, ...]:
+    if not q:
+        return tuple(result for _, result in ENTRIES[:MAX_RESULTS])
+    exact = [r for terms, r in ENTRIES if q in terms]
+    partial = [
+        r for terms, r in ENTRIES if r not in exact and any(q in term for term in terms)
+    ]
+    return tuple((exact + partial)[:MAX_RESULTS])
+
+
+async def inline_query(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.inline_query
+    await query.answer(
+        search(query.query.strip().lower()),
+        cache_time=INLINE_CACHE_TIME,
+        is_personal=False,
+    )
+
+
+def register_handlers(app):
+    app.add_handler(InlineQueryHandler(inline_query))
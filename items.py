@@ -1,13 +1,24 @@
 from __future__ import annotations
 
+import json
+import os
 import random
-from enum import IntEnum, StrEnum, unique
-from typing import TYPE_CHECKING, Dict, List, Optional, Union
-from db import change_balance_f
+from enum import StrEnum, unique
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional
+
+from config import ITEMS_FILE
 
 if TYPE_CHECKING:
     from models import PlayerModel
 
+# Поведение предметов — классы ниже, данные — в ITEMS_FILE: короткие имена,
+# названия, описания, цены, витрина и таблица лутбокса. Файл компилируется
+# в реестр с хэш-индексом по id и короткому имени; reload_items() собирает
+# новый реестр целиком и только потом подменяет текущий, так что битый
+# файл ничего не ломает, а живые хендлеры видят либо старое, либо новое.
+
+ITEMS_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), ITEMS_FILE)
+
 
 @unique
 class ItemId(StrEnum):
@@ -16,15 +27,7 @@ class ItemId(StrEnum):
     Insurance = "insurance"
     HotCard = "hot_card"
     Escape = "escape"
-
-
-@unique
-class ItemIdShortName(StrEnum):
-    Lootbox = "lb"
-    Calculator = "calc"
-    Insurance = "ins"
-    HotCard = "hc"
-    Escape = "esc"
+    Advisor = "advisor"
 
 
 def _inv(player: "PlayerModel") -> Dict[str, int]:
@@ -38,6 +41,23 @@ class Item:
     desc: str
     price: int
 
+    def __init__(self, spec: dict):
+        if not isinstance(spec, dict):
+            raise ValueError(f"{self.id}: ожидается объект с описанием")
+        self.id_short_name = spec["short"]
+        self.name = spec["name"]
+        self.desc = spec["desc"]
+        self.price = spec["price"]
+        self.in_shop = spec.get("shop", False)
+        for key in ("short", "name", "desc"):
+            if not isinstance(spec[key], str) or not spec[key]:
+                raise ValueError(f"{self.id}: {key} должно быть непустой строкой")
+        # bool в JSON — тоже int для isinstance, поэтому точный тип
+        if type(self.price) is not int or self.price < 0:
+            raise ValueError(f"{self.id}: цена должна быть целым числом ≥ 0")
+        if type(self.in_shop) is not bool:
+            raise ValueError(f"{self.id}: shop должно быть true или false")
+
     @staticmethod
     def _assert_positive(qty: int) -> None:
         if qty < 1:
@@ -88,30 +108,42 @@ class Item:
 
 class LootBox(Item):
     id = ItemId.Lootbox
-    id_short_name = ItemIdShortName.Lootbox
-    name = "🎁 Лутбокс"
-    desc = "Содержит случайные предметы и монеты"
-    price = 200
     stackable = True
 
-    # chance, min, max
-    LOOT_TABLE: dict[Optional[str], tuple[int, int, int]] = {
-        "coins": (30, 0, 150),
-        ItemId.Escape: (25, 1, 3),
-        ItemId.Insurance: (15, 1, 3),
-        ItemId.Lootbox: (20, 1, 3),
-        ItemId.HotCard: (10, 1, 3),
-    }
+    def __init__(self, spec: dict):
+        super().__init__(spec)
+        loot = spec["loot"]
+        if not isinstance(loot, dict) or not loot:
+            raise ValueError(f"{self.id}: loot — объект {{предмет: [шанс, мин, макс]}}")
+        # chance, min, max; "nothing" — пустой выпад
+        self.loot_table: dict[Optional[str], tuple[int, int, int]] = {}
+        for key, cfg in loot.items():
+            if key not in ("nothing", "coins") and key not in ITEM_CLASSES:
+                raise ValueError(f"{self.id}: в луте неизвестный предмет {key}")
+            if (
+                not isinstance(cfg, list)
+                or len(cfg) != 3
+                or any(type(v) is not int for v in cfg)
+                or cfg[0] < 0
+                or not 0 <= cfg[1] <= cfg[2]
+            ):
+                raise ValueError(f"{self.id}: неверная строка лута {key}: {cfg}")
+            self.loot_table[None if key == "nothing" else key] = tuple(cfg)
+        self._choices = list(self.loot_table)
+        self._weights = [cfg[0] for cfg in self.loot_table.values()]
+        if not sum(self._weights):
+            raise ValueError(f"{self.id}: у лута все шансы нулевые")
 
     def open_lootbox(self, player: "PlayerModel", qty: int = 1) -> str:
-        choices = list(self.LOOT_TABLE.keys())
-        weights = [cfg[0] for cfg in self.LOOT_TABLE.values()]
+        # db тянет за собой движок и миграции, а ItemId нужен и без базы
+        # (движок блэкджека, симулятор)
+        from db import change_balance_f
 
         awarded: dict[str, int] = {}
 
         for _ in range(qty):
-            picked = random.choices(choices, weights=weights, k=1)[0]
-            weight, mn, mx = self.LOOT_TABLE[picked]
+            picked = random.choices(self._choices, weights=self._weights, k=1)[0]
+            weight, mn, mx = self.loot_table[picked]
 
             if picked == "coins":
                 tens_min = mn // 10
@@ -158,10 +190,6 @@ class LootBox(Item):
 
 class Calculator(Item):
     id = ItemId.Calculator
-    id_short_name = ItemIdShortName.Calculator
-    name = "📱 Калькулятор"
-    desc = "Автоматически cчитает карты на твоей руке за столом в blackjack, возможно иметь только один калькулятор"
-    price = 500
 
     def buy(self, player: "PlayerModel", qty: int = 1) -> str:
         self._possible_have_only_one(player, self)
@@ -175,10 +203,6 @@ class Calculator(Item):
 
 class Insurance(Item):
     id = ItemId.Insurance
-    id_short_name = ItemIdShortName.Insurance
-    name = "🛡 Талончик-страховка"
-    desc = "Позволяет застраховать свою ставку в blackjack, если у дилера туз первой картой"
-    price = 50
 
     def buy(self, player: "PlayerModel", qty: int = 1) -> str:
         return self._impossible_to_buy(self)
@@ -189,10 +213,6 @@ class Insurance(Item):
 
 class HotCard(Item):
     id = ItemId.HotCard
-    id_short_name = ItemIdShortName.HotCard
-    name = "🌡️ Картоградусник"
-    desc = "Узнай какого номинала несколько ближайших карт в колоде"
-    price = 200
 
     def buy(self, player: "PlayerModel", qty: int = 1) -> str:
         return self._impossible_to_buy(self)
@@ -203,10 +223,6 @@ class HotCard(Item):
 
 class Escape(Item):
     id = ItemId.Escape
-    id_short_name = ItemIdShortName.Escape
-    name = "🏃 Побег"
-    desc = "Позволяет сбежать из игры в блэкджек, потеряв половину своей ставки"
-    price = 100
 
     def buy(self, player: "PlayerModel", qty: int = 1) -> str:
         return self._impossible_to_buy(self)
@@ -215,41 +231,128 @@ class Escape(Item):
         return self._impossible_to_use(self)
 
 
-ITEMS: Dict[str, Item] = {
-    ItemId.Lootbox: LootBox(),
-    ItemId.Calculator: Calculator(),
-    ItemId.Insurance: Insurance(),
-    ItemId.HotCard: HotCard(),
-    ItemId.Escape: Escape(),
-}
+class Advisor(Item):
+    id = ItemId.Advisor
+
+    def buy(self, player: "PlayerModel", qty: int = 1) -> str:
+        self._possible_have_only_one(player, self)
+        self._purchase(player, self, 1)
+        self._change_amount(player, ItemId.Advisor, 1)
+        return f"✅ Куплен {self.name}!"
+
+    def use(self, player: "PlayerModel", qty: int = 1) -> str:
+        return self._impossible_to_use(self)
+
 
-SHOP_ITEMS: Dict[str, Item] = {
-    ItemId.Lootbox: LootBox(),
-    ItemId.Calculator: Calculator(),
+ITEM_CLASSES: Dict[str, type] = {
+    cls.id: cls for cls in (LootBox, Calculator, Insurance, HotCard, Escape, Advisor)
 }
 
 
+def shop_item_text(it: Item) -> str:
+    return f"{it.name} — {it.price} монет\n🔑 <{it.id}> <{it.id_short_name}>\n📄: {it.desc}"
+
+
+class Registry:
+    __slots__ = ("items", "shop", "aliases", "shop_aliases", "shop_text")
+
+    def __init__(self, data: Dict[str, dict]):
+        if not isinstance(data, dict):
+            raise ValueError("ожидается объект {id: описание}")
+        missing = [i for i in ITEM_CLASSES if i not in data]
+        unknown = [i for i in data if i not in ITEM_CLASSES]
+        if missing or unknown:
+            raise ValueError(
+                f"нет описания: {', '.join(map(str, missing)) or '—'}, "
+                f"нет такого предмета: {', '.join(unknown) or '—'}"
+            )
+        self.items: Dict[str, Item] = {}
+        self.aliases: Dict[str, Item] = {}
+        for item_id, spec in data.items():
+            try:
+                item = ITEM_CLASSES[item_id](spec)
+            except KeyError as e:
+                raise ValueError(f"{item_id}: нет поля {e}") from None
+            except ValueError:
+                raise
+            except Exception as e:
+                # хендлер перезагрузки ловит только OSError и ValueError
+                raise ValueError(f"{item_id}: неверное описание: {e!r}") from None
+            for alias in (item.id, item.id_short_name):
+                if self.aliases.setdefault(alias, item) is not item:
+                    raise ValueError(f"{item_id}: имя {alias} уже занято")
+            self.items[item.id] = item
+        self.shop = {i: it for i, it in self.items.items() if it.in_shop}
+        self.shop_aliases = {a: it for a, it in self.aliases.items() if it.in_shop}
+        # витрина меняется только вместе с реестром — текст собираем здесь
+        self.shop_text = "\n\n".join(
+            ["🛍 Доступные товарчики:"]
+            + [shop_item_text(it) for it in self.shop.values()]
+        )
+
+
+def load_items(path: str = ITEMS_PATH) -> Registry:
+    with open(path, encoding="utf-8") as f:
+        return Registry(json.load(f))
+
+
+# ITEMS и SHOP_ITEMS импортируют по ссылке, поэтому при перезагрузке они
+# обновляются на месте; всё, что собрано из предметов заранее (клавиатуры,
+# инлайн-статьи), пересобирают хуки on_reload
+ITEMS: Dict[str, Item] = {}
+SHOP_ITEMS: Dict[str, Item] = {}
+_registry: Registry = load_items()
+_reload_hooks: List[Callable[[], None]] = []
+
+
+def _install(registry: Registry) -> None:
+    # без await внутри: ни одна корутина не увидит полуобновлённый реестр
+    global _registry
+    _registry = registry
+    ITEMS.clear()
+    ITEMS.update(registry.items)
+    SHOP_ITEMS.clear()
+    SHOP_ITEMS.update(registry.shop)
+
+
+def reload_items(path: str = ITEMS_PATH) -> Registry:
+    # битый файл — исключение (OSError, ValueError), реестр прежний
+    registry = load_items(path)
+    _install(registry)
+    for hook in _reload_hooks:
+        hook()
+    return registry
+
+
+def on_reload(hook: Callable[[], None]) -> Callable[[], None]:
+    _reload_hooks.append(hook)
+    return hook
+
+
+_install(_registry)
+
+
+def shop_text() -> str:
+    return _registry.shop_text
+
+
 def get_item(item_id: str) -> Item | None:
-    for item in ITEMS.values():
-        if item.id == item_id or item.id_short_name == item_id:
-            return item
+    return _registry.aliases.get(item_id)
 
 
 def get_shop_item(item_id: str) -> Item | None:
-    for item in SHOP_ITEMS.values():
-        if item.id == item_id or item.id_short_name == item_id:
-            return item
+    return _registry.shop_aliases.get(item_id)
 
 
 def player_has_item(player: "PlayerModel", item_id: str, qty: int = 1) -> bool:
-    item = get_item(item_id)
+    item = _registry.aliases.get(item_id)
     if not item:
         return False
     return Item._player_has_item(player, item, qty)
 
 
 def change_item_amount(player: "PlayerModel", item_id: str, delta: int) -> None:
-    item = get_item(item_id)
+    item = _registry.aliases.get(item_id)
     if not item:
         raise ValueError(f"Предмет с id {item_id} не найден")
     Item._change_amount(player, item.id, delta)
@@ -1,4 +1,6 @@
 import asyncio
+from functools import partial
+from typing import Optional
 from telegram import Update
 from telegram.ext import (
     ApplicationBuilder,
@@ -9,8 +11,13 @@ from telegram.ext import (
 )
 from db import SessionLocal, get_player, get_room
 from models import PlayerModel
+import outbox
+from outbox import Outbox
+from timers import Timers
+from actors import Actors
+from tracing import TRACER
 
-from items import SHOP_ITEMS, get_shop_item, get_item, player_has_item
+from items import get_shop_item, get_item, player_has_item, reload_items, shop_text
 from handlers import (
     HandlerStatus,
     HandlerTop,
@@ -20,12 +27,33 @@ from handlers import (
     HandlerUse,
     HandlerBlackJack,
     HandlerWiki,
+    HandlerReloadItems,
 )
 
-from games.bjack import register_handlers as register_bjack_handlers
+from games import checkpoint
+from games.bjack import BlackjackGame, register_handlers as register_bjack_handlers
+from games.rps import RPSGame
 from wiki import register_handlers as register_wiki_handlers
-
-from config import SPIN_COST, TOKEN
+from inline import register_handlers as register_inline_handlers
+from shedding import register_handlers as register_shedding
+from memory import register_handlers as register_memory
+from webhook import run_webhook
+from concurrency import ChatOrderedUpdateProcessor
+from runner import run_polling
+from tenancy import BOT_NS, NamespacedJobQueue, bot_ns
+from persistence import SQLitePersistence
+from sharding import run_supervisor, shard_filter
+from transport import log_request_metrics, make_poll_request, make_send_request
+
+from config import (
+    ADMIN_IDS,
+    BOT_MODE,
+    BOT_WORKERS,
+    EXTRA_BOT_TOKENS,
+    REQUEST_METRICS_INTERVAL,
+    SPIN_COST,
+    TOKEN,
+)
 
 MAP = [1, 2, 3, 0]
 
@@ -45,50 +73,40 @@ def _calc_prize(val: int, symbols: list[int], sevens: int) -> tuple[bool, int]:
     return False, 0
 
 
-async def safe_reply(msg_obj, text: str, **kwargs):
-    from telegram.error import TimedOut
+def _outbox(context: ContextTypes.DEFAULT_TYPE) -> Outbox:
+    return context.application.bot_data["outbox"]
 
-    for attempt in range(3):
-        try:
-            return await msg_obj.reply_text(text, **kwargs)
-        except TimedOut:
-            if attempt < 2:
-                await asyncio.sleep(1)
-                continue
-            raise
 
-
-async def _reply_clean(
+def _reply_clean(
     update: Update,
     context: ContextTypes.DEFAULT_TYPE,
     text: str,
     *,
     is_slot: bool = False,
+    session=None,
     **kwargs,
 ):
     chat_id = update.effective_chat.id
     store = context.user_data
 
+    msgs = []
     for key in ("last_bot_id", "last_user_id", "last_slot_id"):
         mid = store.pop(key, None)
         if mid:
-            try:
-                await context.bot.delete_message(chat_id, mid)
-            except Exception:
-                pass
+            msgs.append(outbox.remove(chat_id, mid))
 
     msg_obj = update.effective_message
-    if not msg_obj:
-        return
+    if msg_obj:
 
-    bot_msg = await safe_reply(msg_obj, text, **kwargs)
+        def remember(bot_msg):
+            if is_slot:
+                store["last_slot_id"] = msg_obj.message_id
+            store["last_bot_id"] = bot_msg.message_id
+            store["last_user_id"] = msg_obj.message_id
 
-    if is_slot:
-        store["last_slot_id"] = msg_obj.message_id
-    store["last_bot_id"] = bot_msg.message_id
-    store["last_user_id"] = msg_obj.message_id
+        msgs.append(outbox.reply(msg_obj, text, on_sent=remember, **kwargs))
 
-    return bot_msg
+    _outbox(context).submit(msgs, session)
 
 
 def _is_chat_registered_for_events(
@@ -107,7 +125,7 @@ async def casino_spin(update: Update, context: ContextTypes.DEFAULT_TYPE):
         room = get_room(db, chat_id)
 
         if player.balance < SPIN_COST:
-            await _reply_clean(
+            _reply_clean(
                 update, context, f"❌ {player.first_name}, недостаточно очков. Отдохни!"
             )
             return
@@ -120,22 +138,24 @@ async def casino_spin(update: Update, context: ContextTypes.DEFAULT_TYPE):
         player.balance += prize
         profit = prize - SPIN_COST
         balance = player.balance
-        db.commit()
 
-    for key in ("last_bot_id", "last_slot_id", "last_user_id"):
-        mid = context.user_data.pop(key, None)
-        if mid:
-            try:
-                await context.bot.delete_message(chat_id, mid)
-            except Exception:
-                pass
+        store = context.user_data
+        msgs = []
+        for key in ("last_bot_id", "last_slot_id", "last_user_id"):
+            mid = store.pop(key, None)
+            if mid:
+                msgs.append(outbox.remove(chat_id, mid))
 
-    trend = "🤑" if profit > 0 else "💀" if profit < 0 else "😑"
-    text = f"🏦: {balance:,} | {trend} {profit:+,}"
+        trend = "🤑" if profit > 0 else "💀" if profit < 0 else "😑"
+        text = f"🏦: {balance:,} | {trend} {profit:+,}"
 
-    bot_msg = await safe_reply(dice_msg, text)
-    context.user_data["last_slot_id"] = dice_msg.message_id
-    context.user_data["last_bot_id"] = bot_msg.message_id
+        def remember(bot_msg):
+            store["last_slot_id"] = dice_msg.message_id
+            store["last_bot_id"] = bot_msg.message_id
+
+        msgs.append(outbox.reply(dice_msg, text, on_sent=remember))
+        _outbox(context).stage(db, *msgs)
+        db.commit()
 
 
 async def status_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -145,7 +165,11 @@ async def status_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         p = get_player(session, user.id, chat_id, user.first_name)
         higher_count = (
             session.query(PlayerModel)
-            .filter(PlayerModel.room_id == chat_id, PlayerModel.balance > p.balance)
+            .filter(
+                PlayerModel.room_id == chat_id,
+                PlayerModel.bot_ns == BOT_NS.get(),
+                PlayerModel.balance > p.balance,
+            )
             .count()
         )
         rank = higher_count + 1
@@ -168,7 +192,7 @@ async def status_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         f"📦 Инвентарь:\n"
         f"{inventory_text}"
     )
-    await _reply_clean(update, context, msg)
+    _reply_clean(update, context, msg)
 
 
 async def top_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -176,33 +200,33 @@ async def top_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     with SessionLocal() as session:
         top = (
             session.query(PlayerModel)
-            .filter(PlayerModel.room_id == chat_id)
+            .filter(PlayerModel.room_id == chat_id, PlayerModel.bot_ns == BOT_NS.get())
             .order_by(PlayerModel.balance.desc())
             .limit(10)
             .all()
         )
     if not top:
-        await _reply_clean(update, context, "Пока нет ни одного игрока.")
+        _reply_clean(update, context, "Пока нет ни одного игрока.")
         return
     lines = ["🏆 ТОП-10 игроков:"] + [
         f"{i+1}. {p.first_name} (id:{p.id}) — {p.balance:,}" for i, p in enumerate(top)
     ]
-    await _reply_clean(update, context, "\n".join(lines))
+    _reply_clean(update, context, "\n".join(lines))
 
 
 async def buy_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not context.args:
-        await _reply_clean(update, context, "Использование: /buy <id> [кол-во]")
+        _reply_clean(update, context, "Использование: /buy <id> [кол-во]")
         return
     try:
         item_name = str(context.args[0])
         qty = int(context.args[1]) if len(context.args) > 1 else 1
     except ValueError:
-        await _reply_clean(update, context, "Неверные аргументы")
+        _reply_clean(update, context, "Неверные аргументы")
         return
     item = get_shop_item(item_name)
     if not item:
-        await _reply_clean(update, context, "Неизвестный товар")
+        _reply_clean(update, context, "Неизвестный товар")
         return
     user = update.effective_user
     chat_id = update.effective_chat.id
@@ -211,56 +235,66 @@ async def buy_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
         cost = item.price * qty
         buy_result = ""
         if player.balance < cost:
-            await _reply_clean(update, context, "Недостаточно монет, дружок")
+            _reply_clean(update, context, "Недостаточно монет, дружок")
             return
         try:
             buy_result = item.buy(player, qty)
         except ValueError as e:
-            await _reply_clean(update, context, str(e))
+            _reply_clean(update, context, str(e))
             return
-        await _reply_clean(update, context, buy_result)
+        _reply_clean(update, context, buy_result, session=s)
         s.commit()
 
 
 async def use_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not context.args:
-        await _reply_clean(update, context, "Использование: /use <id> [кол-во]")
+        _reply_clean(update, context, "Использование: /use <id> [кол-во]")
         return
     try:
         item_id = str(context.args[0])
         qty = int(context.args[1]) if len(context.args) > 1 else 1
     except ValueError:
-        await _reply_clean(update, context, "Неверные аргументы")
+        _reply_clean(update, context, "Неверные аргументы")
         return
     item = get_item(item_id)
     if not item:
-        await _reply_clean(update, context, "Неизвестный предмет")
+        _reply_clean(update, context, "Неизвестный предмет")
         return
     user = update.effective_user
     chat_id = update.effective_chat.id
     with SessionLocal() as s:
         player = get_player(s, user.id, chat_id, user.first_name)
         if not player_has_item(player, item_id, qty):
-            await _reply_clean(update, context, "Нет такого количества")
+            _reply_clean(update, context, "Нет такого количества")
             return
         try:
             msg = item.use(player, qty)
         except ValueError as e:
-            await _reply_clean(update, context, str(e))
+            _reply_clean(update, context, str(e))
             return
+        _reply_clean(update, context, msg, session=s)
         s.commit()
-    await _reply_clean(update, context, msg)
 
 
 async def shop_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    lines = ["🛍 Доступные товарчики:"]
-    for item_id in SHOP_ITEMS:
-        it = SHOP_ITEMS[item_id]
-        lines.append(
-            f"{it.name} — {it.price} монет\n🔑 <{it.id}> <{it.id_short_name}>\n📄: {it.desc}"
-        )
+    _reply_clean(update, context, shop_text())
 
-    await _reply_clean(update, context, "\n\n".join(lines))
+
+async def reload_items_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    # цены, описания и лут из ITEMS_FILE без рестарта; только для ADMIN_IDS
+    if update.effective_user.id not in ADMIN_IDS:
+        return
+    try:
+        registry = reload_items()
+    except (OSError, ValueError) as e:
+        _reply_clean(update, context, f"❌ Предметы не перезагружены: {e}")
+        return
+    _reply_clean(
+        update,
+        context,
+        f"✅ Предметы перезагружены: {len(registry.items)}, "
+        f"в магазине {len(registry.shop)}",
+    )
 
 
 async def register_chat_for_events_cmd(
@@ -268,16 +302,19 @@ async def register_chat_for_events_cmd(
 ):
     chat_id = update.effective_chat.id
     if _is_chat_registered_for_events(chat_id, context):
-        await _reply_clean(update, context, "Этот чат уже зарегистрирован для ивентов.")
+        _reply_clean(update, context, "Этот чат уже зарегистрирован для ивентов.")
         return
     with SessionLocal() as session:
         chat_model = get_room(session, chat_id)
         chat_model.events = True
         context.application.bot_data.setdefault("chats", set()).add(chat_id)
+        _reply_clean(
+            update,
+            context,
+            "Чат успешно зарегистрирован для участия в ивентах.",
+            session=session,
+        )
         session.commit()
-    await _reply_clean(
-        update, context, "Чат успешно зарегистрирован для участия в ивентах."
-    )
 
 
 def _fmt_cmds(aliases) -> str:
@@ -303,8 +340,41 @@ async def help_cmd(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.effective_message.reply_text(help_text, parse_mode="HTML")
 
 
-async def after_init(app):
+async def after_init(app, shard: Optional[int] = None):
     app.bot_data["games"] = {}
+    app.bot_data["actors"] = Actors(app)
+    app.bot_data["timers"] = Timers(app.bot_data["actors"])
+    app.bot_data["outbox"] = Outbox(
+        app.bot, ns=getattr(app.update_processor, "ns", ""), owns=shard_filter(shard)
+    )
+    await app.bot_data["outbox"].start()
+    await TRACER.start()
+    await restore_games(app, shard)
+
+
+async def restore_games(app, shard: Optional[int] = None):
+    # игры, которые жили до рестарта: удержанные ставки уже вернул recover,
+    # блэкджек открывает на том же сообщении новую раздачу, RPS закрывается.
+    # Воркер шардинга берёт только чаты, которые супервизор шлёт ему
+    ns = getattr(app.update_processor, "ns", "")
+    token = BOT_NS.set(ns)
+    try:
+        context = app.context_types.context(app)
+        for chat_id, game, data in checkpoint.recover(ns, owns=shard_filter(shard)):
+            if game == "bj":
+                await BlackjackGame.resume(context, chat_id, data)
+            else:
+                RPSGame.abort(context, chat_id, data)
+    finally:
+        BOT_NS.reset(token)
+
+
+async def before_stop(app):
+    # сначала игры: акторы и их таймеры ещё могут положить сообщения в outbox
+    await app.bot_data["actors"].stop()
+    await app.bot_data["timers"].stop()
+    await app.bot_data["outbox"].stop()
+    await TRACER.stop()
 
 
 async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE):
@@ -320,9 +390,41 @@ async def error_handler(update: object, context: ContextTypes.DEFAULT_TYPE):
             pass
 
 
-def main() -> None:
-    app = ApplicationBuilder().token(TOKEN).post_init(after_init).build()
+def build_app(
+    token: str = TOKEN,
+    polling: bool = True,
+    ns: str = "",
+    requests=None,
+    shard: Optional[int] = None,
+):
+    # requests: общие пулы (send, poll) для нескольких ботов процесса;
+    # метрики по ним пишет тот, кто их создал. shard — номер воркера при
+    # BOT_WORKERS > 1
+    own_requests = requests is None
+    if own_requests:
+        requests = [make_send_request()]
+        if polling:
+            requests.append(make_poll_request())
+    builder = (
+        ApplicationBuilder()
+        .token(token)
+        .request(requests[0])
+        .concurrent_updates(ChatOrderedUpdateProcessor(ns=ns))
+        .job_queue(NamespacedJobQueue(ns))
+        .persistence(SQLitePersistence(ns=ns, shard=shard))
+        .post_init(partial(after_init, shard=shard))
+        .post_stop(before_stop)
+    )
+    if polling:
+        builder = builder.get_updates_request(requests[1])
+    else:
+        builder = builder.updater(None)
+    app = builder.build()
     app.add_error_handler(error_handler)
+    if own_requests and REQUEST_METRICS_INTERVAL:
+        app.job_queue.run_repeating(
+            log_request_metrics, interval=REQUEST_METRICS_INTERVAL, data=requests
+        )
 
     slot_filter = filters.Dice.SLOT_MACHINE & ~filters.FORWARDED
     app.add_handler(MessageHandler(slot_filter, casino_spin))
@@ -334,11 +436,43 @@ def main() -> None:
     app.add_handler(CommandHandler(list(HandlerShop), shop_cmd))
     app.add_handler(CommandHandler(list(HandlerBuy), buy_cmd))
     app.add_handler(CommandHandler(list(HandlerUse), use_cmd))
+    app.add_handler(CommandHandler(list(HandlerReloadItems), reload_items_cmd))
 
+    register_memory(app)
+    register_shedding(app)
     register_bjack_handlers(app)
     register_wiki_handlers(app)
+    register_inline_handlers(app)
+    return app
+
+
+def build_apps(tokens, polling: bool = True):
+    requests = [make_send_request()]
+    if polling:
+        requests.append(make_poll_request(bots=len(tokens)))
+    apps = [
+        build_app(token, polling, ns=bot_ns(token, i == 0), requests=requests)
+        for i, token in enumerate(tokens)
+    ]
+    if REQUEST_METRICS_INTERVAL:
+        apps[0].job_queue.run_repeating(
+            log_request_metrics, interval=REQUEST_METRICS_INTERVAL, data=requests
+        )
+    return apps
 
-    app.run_polling()
+
+def main() -> None:
+    tokens = [TOKEN, *EXTRA_BOT_TOKENS]
+    if BOT_WORKERS > 1:
+        if EXTRA_BOT_TOKENS:
+            print("Шардинг работает только с BOT_TOKEN, EXTRA_BOT_TOKENS пропущены")
+        run_supervisor(BOT_WORKERS)
+    elif BOT_MODE == "webhook":
+        asyncio.run(run_webhook(build_apps(tokens, polling=False)))
+    elif len(tokens) > 1:
+        asyncio.run(run_polling(build_apps(tokens)))
+    else:
+        build_app().run_polling()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,150 @@
+import sys
+import time
+from collections import OrderedDict
+from typing import Dict, Set
+
+from telegram import Update
+from telegram.ext import ContextTypes, TypeHandler
+
+from config import (
+    CHAT_DATA_TTL,
+    MEMORY_BUDGET_MB,
+    MEMORY_SWEEP_INTERVAL,
+    USER_DATA_TTL,
+)
+
+# Учёт памяти под user_data / chat_data. Каждый апдейт отмечает своего
+# пользователя и чат как свежие (LRU-порядок), раз в MEMORY_SWEEP_INTERVAL
+# выкидываем записи, к которым не обращались дольше TTL, и, если общий
+# размер всё ещё больше бюджета, самые давние — пока не влезем.
+
+TOUCH_GROUP = -2
+SIZE_DEPTH = 4
+
+
+def approx_size(obj, depth: int = SIZE_DEPTH) -> int:
+    # приблизительно: sys.getsizeof по контейнерам на несколько уровней вглубь
+    size = sys.getsizeof(obj)
+    if depth <= 0:
+        return size
+    if isinstance(obj, dict):
+        for k, v in obj.items():
+            size += approx_size(k, depth - 1) + approx_size(v, depth - 1)
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        for v in obj:
+            size += approx_size(v, depth - 1)
+    elif hasattr(obj, "__dict__"):
+        size += approx_size(vars(obj), depth - 1)
+    return size
+
+
+class StateTracker:
+    def __init__(self, name: str, ttl: float):
+        self.name = name
+        self.ttl = ttl
+        self.last_seen: "OrderedDict[int, float]" = OrderedDict()
+        self.sizes: Dict[int, int] = {}
+        self.total = 0
+        self._touched: Set[int] = set()
+        self.evicted = 0
+
+    def touch(self, key: int, now: float):
+        self.last_seen[key] = now
+        self.last_seen.move_to_end(key)
+        self._touched.add(key)
+
+    def sync(self, store: dict, now: float):
+        # записи, поднятые из persistence, до первого апдейта считаем свежими
+        for key in store.keys() - self.last_seen.keys():
+            self.last_seen[key] = now
+            self._touched.add(key)
+        for key in self._touched:
+            size = approx_size(store[key]) if key in store else 0
+            self.total += size - self.sizes.pop(key, 0)
+            if size:
+                self.sizes[key] = size
+        self._touched.clear()
+
+    def expired(self, now: float):
+        for key, seen in self.last_seen.items():
+            if now - seen < self.ttl:
+                break
+            yield key
+
+    def oldest(self):
+        return next(iter(self.last_seen), None)
+
+    def forget(self, key: int):
+        self.last_seen.pop(key, None)
+        self._touched.discard(key)
+        self.total -= self.sizes.pop(key, 0)
+        self.evicted += 1
+
+
+class MemoryGovernor:
+    def __init__(
+        self,
+        budget_mb: float = MEMORY_BUDGET_MB,
+        user_ttl: float = USER_DATA_TTL,
+        chat_ttl: float = CHAT_DATA_TTL,
+    ):
+        self.budget = int(budget_mb * 1024 * 1024)
+        self.users = StateTracker("user_data", user_ttl)
+        self.chats = StateTracker("chat_data", chat_ttl)
+
+    async def touch(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        now = time.monotonic()
+        if update.effective_user:
+            self.users.touch(update.effective_user.id, now)
+        if update.effective_chat:
+            self.chats.touch(update.effective_chat.id, now)
+
+    async def sweep(self, context: ContextTypes.DEFAULT_TYPE):
+        app = context.application
+        now = time.monotonic()
+        stores = (
+            (self.users, app.user_data, app.drop_user_data),
+            (self.chats, app.chat_data, app.drop_chat_data),
+        )
+        for tracker, store, drop in stores:
+            tracker.sync(store, now)
+            for key in list(tracker.expired(now)):
+                drop(key)
+                tracker.forget(key)
+
+        # бюджет общий: выселяем более давнюю запись из двух хранилищ
+        while self.used > self.budget:
+            tracker, store, drop = min(
+                (s for s in stores if s[0].last_seen),
+                key=lambda s: s[0].last_seen[s[0].oldest()],
+                default=(None, None, None),
+            )
+            if tracker is None:
+                break
+            key = tracker.oldest()
+            drop(key)
+            tracker.forget(key)
+
+        print(self.report())
+
+    @property
+    def used(self) -> int:
+        return self.users.total + self.chats.total
+
+    def report(self) -> str:
+        parts = [
+            f"{t.name} {len(t.sizes)} шт / {t.total / 1024:.0f} КБ, выселено {t.evicted}"
+            for t in (self.users, self.chats)
+        ]
+        return (
+            f"Память: {self.used / 1024:.0f} из {self.budget / 1024:.0f} КБ "
+            f"({'; '.join(parts)})"
+        )
+
+
+def register_handlers(app):
+    governor = MemoryGovernor()
+    app.add_handler(TypeHandler(Update, governor.touch), group=TOUCH_GROUP)
+    if MEMORY_SWEEP_INTERVAL:
+        app.job_queue.run_repeating(governor.sweep, interval=MEMORY_SWEEP_INTERVAL)
+    return governor
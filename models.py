@@ -1,4 +1,13 @@
-from sqlalchemy import Column, Integer, String, BigInteger, Boolean, JSON
+from sqlalchemy import (
+    Column,
+    Integer,
+    String,
+    BigInteger,
+    Boolean,
+    JSON,
+    LargeBinary,
+    Index,
+)
 from sqlalchemy.orm import declarative_base
 from sqlalchemy.ext.mutable import MutableDict
 
@@ -7,9 +16,13 @@ Base = declarative_base()
 
 class PlayerModel(Base):
     __tablename__ = "players"
+    # точный ключ игрока: без него SQLite может выбрать индекс bot_ns, у
+    # которого у всех строк бота одно значение, и UPDATE сканирует таблицу
+    __table_args__ = (Index("ix_players_ns_room_tg", "bot_ns", "room_id", "tg_id"),)
     id = Column(Integer, primary_key=True, autoincrement=True)
     tg_id = Column(BigInteger, nullable=False, index=True)
     room_id = Column(Integer, nullable=False, index=True)
+    bot_ns = Column(String, nullable=False, default="", server_default="", index=True)
     first_name = Column(String, nullable=False)
     balance = Column(Integer, default=5)
     items = Column(MutableDict.as_mutable(JSON), default=dict)
@@ -17,7 +30,34 @@ class PlayerModel(Base):
 
 class RoomModel(Base):
     __tablename__ = "room"
+    __table_args__ = (Index("ux_room_ns_chat", "bot_ns", "chat_tg_id", unique=True),)
     id = Column(Integer, primary_key=True, autoincrement=True)
-    chat_tg_id = Column(BigInteger, unique=True, nullable=False, index=True)
+    chat_tg_id = Column(BigInteger, nullable=False, index=True)
+    bot_ns = Column(String, nullable=False, default="", server_default="")
     jackpot = Column(Integer, default=10)
     events = Column(Boolean, default=False)
+
+
+class OutboxModel(Base):
+    __tablename__ = "outbox"
+    id = Column(Integer, primary_key=True, autoincrement=True)
+    # чей токен отправляет: у каждого бота процесса свой Outbox
+    bot_ns = Column(String, nullable=False, default="", server_default="", index=True)
+    payload = Column(JSON, nullable=False)
+
+
+class StateModel(Base):
+    __tablename__ = "bot_state"
+    kind = Column(String, primary_key=True)
+    key = Column(String, primary_key=True)
+    data = Column(LargeBinary, nullable=False)
+
+
+class GameCheckpointModel(Base):
+    # снимок живой игры на последней смене стадии, см. games/checkpoint.py
+    __tablename__ = "game_checkpoint"
+    bot_ns = Column(String, primary_key=True)
+    chat_id = Column(BigInteger, primary_key=True)
+    game = Column(String, nullable=False)  # bj | rps
+    stage = Column(String, nullable=False)
+    data = Column(JSON, nullable=False)
@@ -0,0 +1,217 @@
+import asyncio
+import logging
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import delete, event, select
+from sqlalchemy.orm import Session
+from telegram import InlineKeyboardMarkup
+from telegram.error import BadRequest, Forbidden, RetryAfter, TimedOut
+
+from config import OUTBOX_PERSIST, OUTBOX_RETRIES, OUTBOX_WORKERS
+from db import SessionLocal
+from models import OutboxModel
+from transport import PoolTimedOut
+
+# Исходящие сообщения бота. Хендлеры кладут их в очередь вместе со своей
+# DB-транзакцией, а отправляют их воркеры уже после коммита — так сессия
+# SQLAlchemy никогда не держится открытой на время сетевого запроса.
+# Сохранённые строки (OUTBOX_PERSIST) помечены ns бота: после рестарта
+# каждый бот процесса дошлёт только своё, а воркер шардинга — только в
+# свои чаты (owns).
+
+_STAGED = "outbox_staged"
+DRAIN_TIMEOUT = 10
+
+
+@dataclass
+class OutMessage:
+    method: str  # send_message | edit_message_text | delete_message
+    kwargs: Dict[str, Any]
+    on_sent: Optional[Callable[[Any], None]] = field(default=None, compare=False)
+    row_id: Optional[int] = None
+
+    @property
+    def chat_id(self) -> int:
+        return self.kwargs["chat_id"]
+
+    def to_payload(self) -> dict:
+        kwargs = dict(self.kwargs)
+        markup = kwargs.get("reply_markup")
+        if isinstance(markup, InlineKeyboardMarkup):
+            kwargs["reply_markup"] = markup.to_dict()
+        return {"method": self.method, "kwargs": kwargs}
+
+    @classmethod
+    def from_payload(cls, payload: dict, row_id: int) -> "OutMessage":
+        kwargs = dict(payload["kwargs"])
+        if isinstance(kwargs.get("reply_markup"), dict):
+            kwargs["reply_markup"] = InlineKeyboardMarkup.de_json(
+                kwargs["reply_markup"], None
+            )
+        return cls(method=payload["method"], kwargs=kwargs, row_id=row_id)
+
+
+def send(chat_id: int, text: str, on_sent=None, **kwargs) -> OutMessage:
+    return OutMessage(
+        "send_message", {"chat_id": chat_id, "text": text, **kwargs}, on_sent
+    )
+
+
+def reply(msg_obj, text: str, on_sent=None, **kwargs) -> OutMessage:
+    return send(
+        msg_obj.chat_id,
+        text,
+        on_sent,
+        reply_to_message_id=msg_obj.message_id,
+        allow_sending_without_reply=True,
+        **kwargs,
+    )
+
+
+def edit(chat_id: int, message_id: int, text: str, **kwargs) -> OutMessage:
+    return OutMessage(
+        "edit_message_text",
+        {"chat_id": chat_id, "message_id": message_id, "text": text, **kwargs},
+    )
+
+
+def remove(chat_id: int, message_id: int) -> OutMessage:
+    return OutMessage("delete_message", {"chat_id": chat_id, "message_id": message_id})
+
+
+class Outbox:
+    def __init__(
+        self,
+        bot,
+        workers: int = OUTBOX_WORKERS,
+        persist: bool = OUTBOX_PERSIST,
+        ns: str = "",
+        owns: Optional[Callable[[int], bool]] = None,
+    ):
+        self.bot = bot
+        self.persist = persist
+        self.ns = ns
+        self.owns = owns
+        # одна очередь на воркер, чат всегда попадает в одну и ту же —
+        # сообщения внутри чата уходят строго по порядку
+        self._queues: List[asyncio.Queue] = [
+            asyncio.Queue() for _ in range(max(1, workers))
+        ]
+        self._tasks: List[asyncio.Task] = []
+
+    async def start(self):
+        if self.persist:
+            self._load_pending()
+        self._tasks = [asyncio.create_task(self._worker(q)) for q in self._queues]
+
+    async def stop(self):
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(q.join() for q in self._queues)), DRAIN_TIMEOUT
+            )
+        except asyncio.TimeoutError:
+            print("Outbox: не успели отправить все сообщения до остановки")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def put(self, *msgs: OutMessage) -> None:
+        if self.persist:
+            with SessionLocal() as s:
+                rows = [self._persist(s, msg) for msg in msgs]
+                s.commit()
+            for msg, row in zip(msgs, rows):
+                msg.row_id = row.id
+        for msg in msgs:
+            self._enqueue(msg)
+
+    def stage(self, session: Session, *msgs: OutMessage) -> None:
+        # сообщения уйдут только если транзакция session закоммитится
+        if not session.in_transaction():
+            session.begin()
+        staged = session.info.setdefault(_STAGED, [])
+        for msg in msgs:
+            row = self._persist(session, msg) if self.persist else None
+            staged.append((self, msg, row))
+
+    def submit(self, msgs: List[OutMessage], session: Optional[Session] = None):
+        if session is None:
+            self.put(*msgs)
+        else:
+            self.stage(session, *msgs)
+
+    def _persist(self, session: Session, msg: OutMessage) -> OutboxModel:
+        row = OutboxModel(bot_ns=self.ns, payload=msg.to_payload())
+        session.add(row)
+        return row
+
+    def _enqueue(self, msg: OutMessage) -> None:
+        self._queues[msg.chat_id % len(self._queues)].put_nowait(msg)
+
+    def _load_pending(self):
+        with SessionLocal() as s:
+            rows = s.execute(
+                select(OutboxModel)
+                .where(OutboxModel.bot_ns == self.ns)
+                .order_by(OutboxModel.id)
+            ).scalars()
+            pending = [OutMessage.from_payload(r.payload, r.id) for r in rows]
+        if self.owns is not None:
+            pending = [msg for msg in pending if self.owns(msg.chat_id)]
+        if pending:
+            print(f"Outbox: восстановлено {len(pending)} неотправленных сообщений")
+        for msg in pending:
+            self._enqueue(msg)
+
+    async def _worker(self, queue: asyncio.Queue):
+        while True:
+            msg = await queue.get()
+            try:
+                await self._deliver(msg)
+            except Exception:
+                logging.exception("Outbox: ошибка отправки %s", msg.method)
+            finally:
+                queue.task_done()
+
+    async def _deliver(self, msg: OutMessage):
+        result = None
+        for attempt in range(OUTBOX_RETRIES):
+            try:
+                result = await getattr(self.bot, msg.method)(**msg.kwargs)
+                break
+            except RetryAfter as e:
+                await asyncio.sleep(e.retry_after)
+            except TimedOut as e:
+                # send_message с read timeout мог дойти — повтор дал бы дубль;
+                # правки/удаления и не ушедшие из пула запросы повторять можно
+                retryable = isinstance(e, PoolTimedOut) or msg.method != "send_message"
+                if not retryable or attempt == OUTBOX_RETRIES - 1:
+                    raise
+                await asyncio.sleep(1)
+            except (BadRequest, Forbidden) as e:
+                # сообщение уже удалено / не изменилось / бота выгнали —
+                # повторять бессмысленно
+                print(f"Outbox: {msg.method} в чат {msg.chat_id} отброшен: {e}")
+                break
+        if msg.row_id is not None:
+            with SessionLocal() as s:
+                s.execute(delete(OutboxModel).where(OutboxModel.id == msg.row_id))
+                s.commit()
+        if result is not None and msg.on_sent:
+            msg.on_sent(result)
+
+
+@event.listens_for(Session, "after_commit")
+def _release_staged(session: Session):
+    for outbox, msg, row in session.info.pop(_STAGED, ()):
+        if row is not None:
+            msg.row_id = row.id
+        outbox._enqueue(msg)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _discard_staged(session: Session, transaction):
+    if transaction.parent is None:
+        session.info.pop(_STAGED, None)
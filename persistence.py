@@ -0,0 +1,186 @@
+import asyncio
+import hashlib
+import json
+import pickle
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.sqlite import insert
+from telegram.ext import BasePersistence, PersistenceInput
+
+from config import PERSIST_BATCH, PERSIST_INTERVAL
+from db import SessionLocal
+from models import StateModel
+
+# user_data / chat_data / bot_data в той же SQLite, что и игроки. Каждая
+# запись — отдельная строка (kind, key), и пишутся только те, чей pickle
+# реально поменялся с прошлой записи: пачкой, раз в PERSIST_INTERVAL.
+# При BOT_WORKERS > 1 у каждого воркера свои строки (префикс с номером
+# шарда): воркер видит только свои чаты, и общий ключ перезаписывался бы
+# тем, кто сбросил последним. Сменили число воркеров — состояние старых
+# шардов не подхватится.
+
+# живые объекты, которые нельзя и не нужно переживать рестарт
+TRANSIENT_BOT_KEYS = {"games", "outbox", "timers", "actors", "mgr"}
+
+USER, CHAT, BOT = "user", "chat", "bot"
+
+Key = Tuple[str, str]
+
+
+class SQLitePersistence(BasePersistence):
+    def __init__(
+        self,
+        update_interval: float = PERSIST_INTERVAL,
+        ns: str = "",
+        shard: Optional[int] = None,
+    ):
+        super().__init__(
+            store_data=PersistenceInput(callback_data=False),
+            update_interval=update_interval,
+        )
+        # у каждого бота процесса свои строки: kind с префиксом его ns,
+        # у воркера шардинга — ещё и с номером шарда
+        self.prefix = f"{ns}:" if ns else ""
+        if shard is not None:
+            self.prefix += f"shard{shard}:"
+        self._digests: Dict[Key, bytes] = {}
+        self._pending: Dict[Key, Optional[bytes]] = {}
+        self._write_scheduled = False
+
+    # --- чтение ---
+
+    def _load(self, kind: str) -> Dict[str, object]:
+        with SessionLocal() as s:
+            rows = s.execute(
+                select(StateModel.key, StateModel.data).where(
+                    StateModel.kind == self.prefix + kind
+                )
+            ).all()
+        result = {}
+        for key, blob in rows:
+            self._digests[(kind, key)] = _digest(blob)
+            result[key] = pickle.loads(blob)
+        return result
+
+    async def get_user_data(self) -> Dict[int, dict]:
+        return {int(k): v for k, v in self._load(USER).items()}
+
+    async def get_chat_data(self) -> Dict[int, dict]:
+        return {int(k): v for k, v in self._load(CHAT).items()}
+
+    async def get_bot_data(self) -> dict:
+        return self._load(BOT)
+
+    async def get_callback_data(self):
+        return None
+
+    async def get_conversations(self, name: str) -> dict:
+        kind = f"conv:{name}"
+        return {tuple(json.loads(k)): v for k, v in self._load(kind).items()}
+
+    # --- запись ---
+
+    async def update_user_data(self, user_id: int, data: dict) -> None:
+        self._mark(USER, str(user_id), data)
+
+    async def update_chat_data(self, chat_id: int, data: dict) -> None:
+        self._mark(CHAT, str(chat_id), data)
+
+    async def update_bot_data(self, data: dict) -> None:
+        stored = {k for kind, k in self._digests if kind == BOT}
+        for key, value in data.items():
+            if key in TRANSIENT_BOT_KEYS:
+                continue
+            self._mark(BOT, str(key), value)
+            stored.discard(str(key))
+        for key in stored:
+            self._drop(BOT, key)
+
+    async def update_callback_data(self, data) -> None:
+        pass
+
+    async def update_conversation(self, name: str, key, new_state) -> None:
+        kind, k = f"conv:{name}", json.dumps(list(key))
+        if new_state is None:
+            self._drop(kind, k)
+        else:
+            self._mark(kind, k, new_state)
+
+    async def drop_user_data(self, user_id: int) -> None:
+        self._drop(USER, str(user_id))
+
+    async def drop_chat_data(self, chat_id: int) -> None:
+        self._drop(CHAT, str(chat_id))
+
+    async def refresh_user_data(self, user_id: int, user_data: dict) -> None:
+        pass
+
+    async def refresh_chat_data(self, chat_id: int, chat_data: dict) -> None:
+        pass
+
+    async def refresh_bot_data(self, bot_data: dict) -> None:
+        pass
+
+    async def flush(self) -> None:
+        self._write()
+
+    # --- грязные ключи ---
+
+    def _mark(self, kind: str, key: str, value) -> None:
+        try:
+            blob = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception as e:
+            print(f"Persistence: {kind}/{key} не сериализуется, пропускаю: {e}")
+            return
+        digest = _digest(blob)
+        if self._digests.get((kind, key)) == digest:
+            return
+        self._digests[(kind, key)] = digest
+        self._pending[(kind, key)] = blob
+        self._schedule_write()
+
+    def _drop(self, kind: str, key: str) -> None:
+        if self._digests.pop((kind, key), None) is None:
+            return
+        self._pending[(kind, key)] = None
+        self._schedule_write()
+
+    def _schedule_write(self):
+        # Application зовёт update_* для всех изменённых ключей одним gather —
+        # пишем всё накопленное одной транзакцией сразу после него
+        if not self._write_scheduled:
+            self._write_scheduled = True
+            asyncio.get_running_loop().call_soon(self._write)
+
+    def _write(self):
+        self._write_scheduled = False
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        upserts = [
+            {"kind": self.prefix + kind, "key": key, "data": blob}
+            for (kind, key), blob in pending.items()
+            if blob is not None
+        ]
+        removed = [k for k, blob in pending.items() if blob is None]
+        with SessionLocal() as s:
+            for i in range(0, len(upserts), PERSIST_BATCH):
+                stmt = insert(StateModel).values(upserts[i : i + PERSIST_BATCH])
+                s.execute(
+                    stmt.on_conflict_do_update(
+                        index_elements=[StateModel.kind, StateModel.key],
+                        set_={"data": stmt.excluded.data},
+                    )
+                )
+            for kind, key in removed:
+                s.execute(
+                    delete(StateModel).where(
+                        StateModel.kind == self.prefix + kind, StateModel.key == key
+                    )
+                )
+            s.commit()
+
+
+def _digest(blob: bytes) -> bytes:
+    return hashlib.blake2b(blob, digest_size=16).digest()
@@ -0,0 +1,40 @@
+import asyncio
+import signal
+from contextlib import AsyncExitStack, asynccontextmanager
+
+# Жизненный цикл Application без run_polling: нужен там, где апдейты
+# приходят не из getUpdates (вебхук, воркеры шардинга) или когда в одном
+# процессе работают несколько ботов.
+
+
+async def wait_for_stop_signal():
+    stop = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stop.set)
+    await stop.wait()
+
+
+@asynccontextmanager
+async def running(app):
+    async with app:
+        if app.post_init:
+            await app.post_init(app)
+        await app.start()
+        try:
+            yield app
+        finally:
+            if app.updater and app.updater.running:
+                await app.updater.stop()
+            await app.stop()
+            if app.post_stop:
+                await app.post_stop(app)
+
+
+async def run_polling(apps):
+    # несколько ботов на одном цикле событий: у каждого свой getUpdates
+    async with AsyncExitStack() as stack:
+        for app in apps:
+            await stack.enter_async_context(running(app))
+            await app.updater.start_polling()
+        await wait_for_stop_signal()
@@ -0,0 +1,196 @@
+import asyncio
+import json
+import multiprocessing
+import signal
+from typing import Callable, List, Optional
+
+from telegram import Bot, Update
+from telegram.error import NetworkError
+
+from config import BOT_MODE, BOT_WORKERS, TOKEN, WEBHOOK_PATH
+from runner import running, wait_for_stop_signal
+from transport import make_poll_request, make_send_request
+from webhook import WebhookServer, register_webhook, ssl_context
+
+# Режим BOT_WORKERS > 1: процесс-супервизор только принимает апдейты
+# (поллинг или вебхук) и раскидывает их по воркерам по chat_id % N. Каждый
+# воркер — отдельный процесс со своим Application, job_queue и коннектами
+# к БД, поэтому bot_data["games"] остаётся локальным и корректным.
+
+POLL_TIMEOUT = 30
+SHARD_QUEUE_LIMIT = 10_000
+WATCHDOG_INTERVAL = 5
+JOIN_TIMEOUT = 15
+
+
+def shard_of(key: int, workers: int) -> int:
+    return key % workers
+
+
+def shard_filter(shard: Optional[int]) -> Optional[Callable[[int], bool]]:
+    # чаты, которые супервизор шлёт воркеру shard; None — шардинга нет
+    if shard is None:
+        return None
+    return lambda chat_id: shard_of(chat_id, BOT_WORKERS) == shard
+
+
+def shard_key(data: dict) -> int:
+    update = Update.de_json(data, None)
+    if update.effective_chat:
+        return update.effective_chat.id
+    if update.effective_user:
+        return update.effective_user.id
+    return update.update_id
+
+
+class Shard:
+    def __init__(self, index: int, mp_ctx):
+        self.index = index
+        self.mp_ctx = mp_ctx
+        self.queue: asyncio.Queue = asyncio.Queue(SHARD_QUEUE_LIMIT)
+        self.process = None
+        self.conn = None
+
+    def spawn(self):
+        recv, send = self.mp_ctx.Pipe(duplex=False)
+        self.process = self.mp_ctx.Process(
+            target=worker_main, args=(self.index, recv), name=f"shard-{self.index}"
+        )
+        self.process.start()
+        recv.close()
+        self.conn = send
+        print(f"Shard {self.index}: воркер запущен, pid {self.process.pid}")
+
+    async def pump(self):
+        while True:
+            payload = await self.queue.get()
+            try:
+                await asyncio.to_thread(self.conn.send_bytes, payload)
+            except (BrokenPipeError, OSError):
+                print(f"Shard {self.index}: воркер недоступен, апдейт потерян")
+
+    async def close(self):
+        self.conn.close()
+        await asyncio.to_thread(self.process.join, JOIN_TIMEOUT)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+class Supervisor:
+    def __init__(self, workers: int):
+        mp_ctx = multiprocessing.get_context("spawn")
+        self.shards: List[Shard] = [Shard(i, mp_ctx) for i in range(workers)]
+        self._tasks: List[asyncio.Task] = []
+
+    def start(self):
+        for shard in self.shards:
+            shard.spawn()
+            self._tasks.append(asyncio.create_task(shard.pump()))
+        self._tasks.append(asyncio.create_task(self._watchdog()))
+
+    async def forward(self, data: dict):
+        shard = self.shards[shard_of(shard_key(data), len(self.shards))]
+        await shard.queue.put(json.dumps(data).encode())
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        # закрытый пайп — сигнал воркеру доработать очередь и выйти
+        await asyncio.gather(*(shard.close() for shard in self.shards))
+
+    async def _watchdog(self):
+        while True:
+            await asyncio.sleep(WATCHDOG_INTERVAL)
+            for shard in self.shards:
+                if not shard.process.is_alive():
+                    print(
+                        f"Shard {shard.index}: воркер упал "
+                        f"(код {shard.process.exitcode}), перезапускаю"
+                    )
+                    shard.conn.close()
+                    shard.spawn()
+
+
+async def _poll(bot: Bot, forward):
+    await bot.delete_webhook()
+    offset = None
+    while True:
+        try:
+            updates = await bot.get_updates(
+                offset=offset,
+                timeout=POLL_TIMEOUT,
+                read_timeout=POLL_TIMEOUT + 10,
+                allowed_updates=Update.ALL_TYPES,
+            )
+        except NetworkError as e:
+            print(f"Ingress: ошибка getUpdates: {e}")
+            await asyncio.sleep(1)
+            continue
+        for update in updates:
+            offset = update.update_id + 1
+            await forward(update.to_dict())
+
+
+async def _supervise(workers: int):
+    supervisor = Supervisor(workers)
+    supervisor.start()
+    bot = Bot(
+        TOKEN, request=make_send_request(), get_updates_request=make_poll_request()
+    )
+    async with bot:
+        server = None
+        ingress = None
+        if BOT_MODE == "webhook":
+            server = WebhookServer(
+                {WEBHOOK_PATH: supervisor.forward}, ssl_ctx=ssl_context()
+            )
+            await server.start()
+            await register_webhook(bot)
+        else:
+            ingress = asyncio.create_task(_poll(bot, supervisor.forward))
+        try:
+            await wait_for_stop_signal()
+        finally:
+            if server:
+                await server.stop()
+            if ingress:
+                ingress.cancel()
+                await asyncio.gather(ingress, return_exceptions=True)
+            await supervisor.stop()
+
+
+def run_supervisor(workers: int):
+    asyncio.run(_supervise(workers))
+
+
+def worker_main(index: int, conn):
+    # Ctrl+C прилетает всей группе процессов — воркер ждёт, пока супервизор
+    # закроет пайп, чтобы не потерять уже переданные апдейты
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_work(index, conn))
+
+
+async def _work(index: int, conn):
+    from main import build_app
+
+    app = build_app(polling=False, shard=index)
+    loop = asyncio.get_running_loop()
+    done = asyncio.Event()
+
+    def on_readable():
+        try:
+            while conn.poll():
+                data = json.loads(conn.recv_bytes())
+                app.update_queue.put_nowait(Update.de_json(data, app.bot))
+        except EOFError:
+            loop.remove_reader(conn.fileno())
+            done.set()
+
+    async with running(app):
+        loop.add_reader(conn.fileno(), on_readable)
+        loop.add_signal_handler(signal.SIGTERM, done.set)
+        await done.wait()
+        # дорабатываем то, что уже успело прийти
+        await app.update_queue.join()
+    print(f"Shard {index}: воркер остановлен")
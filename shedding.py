@@ -0,0 +1,114 @@
+import time
+from collections import Counter
+
+from telegram import Update
+from telegram.error import BadRequest
+from telegram.ext import ApplicationHandlerStop, ContextTypes, TypeHandler
+
+from callbacks import TAPS
+from games.bjack import BlackjackGame, Stage
+from config import (
+    SHED_BACKLOG,
+    SHED_MESSAGE_AGE,
+    SHED_PRESSURE_FACTOR,
+    SHED_REPORT_INTERVAL,
+    SHED_SPIN_AGE,
+)
+
+# Входной фильтр апдейтов (group -1, до всех хендлеров). После простоя или
+# флуда Telegram отдаёт пачку старых апдейтов — давно прокрученные слоты,
+# нажатия по столам, где раунд уже сменился, дубли нажатий. Их выкидываем,
+# не трогая БД и API. Когда очередь разрослась, пороги по возрасту жёстче.
+# Отброшенное нажатие всё же получает answer(), иначе у игрока крутятся
+# «часики», пока Telegram сам не сдастся.
+
+SHED_GROUP = -1
+
+# ответ на отброшенное нажатие; у дубля — пустой, просто гасим «часики»
+DROP_ANSWERS = {"double_tap": None, "stale_round": "Раунд уже завершён"}
+
+
+class LoadShedder:
+    def __init__(self):
+        self.dropped: Counter = Counter()
+        self.passed = 0
+
+    async def check(self, update: Update, context: ContextTypes.DEFAULT_TYPE):
+        reason = self.drop_reason(update, context)
+        if reason is None:
+            self.passed += 1
+            return
+        self.dropped[reason] += 1
+        if reason in DROP_ANSWERS:
+            try:
+                await update.callback_query.answer(DROP_ANSWERS[reason])
+            except BadRequest:
+                pass  # нажатие слишком старое, отвечать уже некому
+        raise ApplicationHandlerStop
+
+    def drop_reason(self, update: Update, context) -> str | None:
+        factor = SHED_PRESSURE_FACTOR if self._backlog(context) >= SHED_BACKLOG else 1
+
+        msg = update.message
+        if msg is not None:
+            age = time.time() - msg.date.timestamp()
+            if msg.dice is not None:
+                if age > SHED_SPIN_AGE * factor:
+                    return "old_spin"
+            elif age > SHED_MESSAGE_AGE * factor:
+                return "old_message"
+            return None
+
+        query = update.callback_query
+        if query is not None and query.data:
+            if TAPS.is_repeat(query):
+                return "double_tap"
+            if self._stale_game_callback(query.data, update, context):
+                return "stale_round"
+        return None
+
+    @staticmethod
+    def _stale_game_callback(data: str, update: Update, context) -> bool:
+        if not data.startswith(("bj_", "rps_")):
+            return False
+        chat = update.effective_chat
+        game = context.application.bot_data.get("games", {}).get(
+            chat.id if chat else None
+        )
+        if game is None:
+            return True
+        if not data.startswith("bj_"):
+            return False
+        if not isinstance(game, BlackjackGame):
+            return True
+        # нажатия со старой клавиатуры: ставка, когда уже раздали, или ход,
+        # когда раунд закончился
+        if data.startswith("bj_bet_"):
+            return game.stage != Stage.Bet
+        return game.stage != Stage.Play
+
+    @staticmethod
+    def _backlog(context) -> int:
+        app = context.application
+        return app.update_queue.qsize() + getattr(app.update_processor, "backlog", 0)
+
+    def report(self) -> str:
+        total = sum(self.dropped.values())
+        details = ", ".join(f"{k}: {v}" for k, v in self.dropped.most_common())
+        return (
+            f"Shedding: пропущено {self.passed}, отброшено {total} ({details or '—'})"
+        )
+
+    async def log_report(self, context: ContextTypes.DEFAULT_TYPE):
+        if self.dropped:
+            print(self.report())
+        self.dropped.clear()
+        self.passed = 0
+
+
+def register_handlers(app):
+    shedder = LoadShedder()
+    app.add_handler(TypeHandler(Update, shedder.check), group=SHED_GROUP)
+    if SHED_REPORT_INTERVAL:
+        app.job_queue.run_repeating(shedder.log_report, interval=SHED_REPORT_INTERVAL)
+    return shedder
@@ -0,0 +1,26 @@
+from contextvars import ContextVar
+
+from telegram.ext import JobQueue
+
+# Несколько брендированных копий бота в одном процессе: общие движок БД,
+# пулы HTTP и кэши, но у каждой копии свои игроки и комнаты. Пространство
+# имён текущего бота живёт в контекстной переменной — её ставят обработчик
+# апдейтов и очередь задач своего Application, а читают хелперы db.py.
+
+BOT_NS: ContextVar[str] = ContextVar("bot_ns", default="")
+
+
+def bot_ns(token: str, primary: bool) -> str:
+    # у основного бота пустое пространство — данные из старой базы остаются его
+    return "" if primary else token.split(":", 1)[0]
+
+
+class NamespacedJobQueue(JobQueue):
+    def __init__(self, ns: str = ""):
+        super().__init__()
+        self.ns = ns
+
+    @staticmethod
+    async def job_callback(job_queue: "NamespacedJobQueue", job) -> None:
+        BOT_NS.set(job_queue.ns)
+        await job.run(job_queue.application)
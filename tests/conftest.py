@@ -0,0 +1,7 @@
+import os
+import sys
+import tempfile
+
+# своя SQLite на прогон: db.py создаёт движок при импорте из DB_URL
+os.environ["DB_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "test.db")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
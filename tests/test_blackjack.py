@@ -0,0 +1,172 @@
+import random
+
+import pytest
+
+from db import SessionLocal, get_player
+from games import bjengine as engine
+from games.bjengine import Credit, Player, Profit, Round, Spend, Stage, UseItem
+from games.cards import RANKS, Hand
+from games.escrow import RoundEscrow
+from items import ItemId
+
+
+def card(rank: str, suit: int = 0) -> int:
+    return RANKS.index(rank) * 4 + suit
+
+
+def hand(*ranks: str) -> Hand:
+    return Hand(card(r, i % 4) for i, r in enumerate(ranks))
+
+
+class Deck:
+    # шуз с заранее известными картами
+    def __init__(self, *ranks: str):
+        self.cards = [card(r) for r in ranks]
+
+    def draw(self) -> int:
+        return self.cards.pop(0)
+
+
+def table(player_hand, dealer_hand, items=None, draws=(), bet=100) -> Round:
+    rnd = Round(shoe=Deck(*draws))
+    rnd.players = [
+        Player(1, "p", hand=player_hand, bet=bet, balance=1000, items=items or {})
+    ]
+    rnd.dealer.hand = dealer_hand
+    rnd.stage = Stage.Play
+    return rnd
+
+
+def total(effects, kind) -> int:
+    return sum(e.amount for e in effects if isinstance(e, kind))
+
+
+# --- движок ---
+
+
+def test_money_balances():
+    staked, spent, credited, profit = engine.simulate(2000, 4, random.Random(7))
+    assert staked == 2000 * 4 * 100
+    assert credited - staked - spent == profit
+
+
+def test_split_cap():
+    rnd = table(hand("8", "8"), hand("10", "7"), draws=["8"] * 10)
+    effects = []
+    for _ in range(engine.MAX_SPLITS):
+        assert engine.precheck(rnd, "split") is None
+        effects += engine.step(rnd, "split")
+    assert engine.precheck(rnd, "split") == "Больше делить нельзя"
+    assert len(rnd.players) == engine.MAX_SPLITS + 1
+    assert total(effects, Spend) == engine.MAX_SPLITS * 100
+    # кошелёк общий у всех рук
+    assert {p.balance for p in rnd.players} == {1000 - engine.MAX_SPLITS * 100}
+
+
+def test_insurance_pays_on_dealer_natural():
+    rnd = table(hand("10", "9"), hand("A", "K"), items={ItemId.Insurance: 1})
+    effects = engine.step(rnd, "insurance")
+    assert total(effects, Spend) == 50
+    assert [e.item_id for e in effects if isinstance(e, UseItem)] == ["insurance"]
+    effects += engine.step(rnd, "stand")
+    effects += engine.finish(rnd)
+    # ставка проиграна, страховка 2:1 вместе со своим взносом
+    assert total(effects, Credit) == 150
+    assert total(effects, Profit) == 0
+
+
+def test_insurance_lost_without_dealer_natural():
+    rnd = table(hand("10", "9"), hand("A", "7"), items={ItemId.Insurance: 1})
+    effects = engine.step(rnd, "insurance") + engine.step(rnd, "stand")
+    effects += engine.finish(rnd)
+    assert total(effects, Credit) == 200
+    assert total(effects, Profit) == 50
+
+
+def test_escape_returns_half():
+    rnd = table(hand("10", "6"), hand("10", "7"), items={ItemId.Escape: 1}, bet=101)
+    effects = engine.step(rnd, "escape") + engine.finish(rnd)
+    assert total(effects, Credit) == 51
+    assert total(effects, Profit) == -51
+    assert rnd.active_player is None
+
+
+def test_dealer_natural_takes_doubled_bet():
+    rnd = table(hand("5", "6"), hand("A", "K"), draws=["10"])
+    effects = engine.step(rnd, "double") + engine.finish(rnd)
+    assert rnd.players[0].hand.value == 21
+    assert total(effects, Spend) == 100
+    assert total(effects, Credit) == 0
+    assert total(effects, Profit) == -200
+
+
+def test_natural_against_dealer_natural_is_push():
+    rnd = table(hand("A", "K"), hand("A", "Q"))
+    effects = engine.step(rnd, "stand") + engine.finish(rnd)
+    assert total(effects, Credit) == 100
+    assert total(effects, Profit) == 0
+
+
+# --- эскроу ---
+
+CHAT = -42
+
+
+def balances(*uids):
+    with SessionLocal() as db:
+        return [get_player(db, uid, CHAT, f"u{uid}").balance for uid in uids]
+
+
+@pytest.fixture
+def players():
+    with SessionLocal() as db:
+        for uid, balance in ((1, 1000), (2, 50)):
+            get_player(db, uid, CHAT, f"u{uid}").balance = balance
+        db.commit()
+
+
+def test_escrow_hold_skips_short_players(players):
+    escrow = RoundEscrow(CHAT)
+    with SessionLocal() as db:
+        held = escrow.hold(db, {1: 300, 2: 100})
+        db.commit()
+    escrow.confirm()
+    assert held == {1: 700}
+    assert balances(1, 2) == [700, 50]
+
+
+def test_escrow_top_up_is_debited_at_move_time(players):
+    escrow = RoundEscrow(CHAT)
+    with SessionLocal() as db:
+        escrow.hold(db, {1: 600})
+        db.commit()
+    escrow.confirm()
+    with SessionLocal() as db:
+        assert escrow.spend(db, 1, 300)
+        # на второе удвоение денег уже нет — списания нет
+        assert not escrow.spend(db, 1, 300)
+        db.commit()
+    assert balances(1) == [100]
+    assert escrow.snapshot() == [[1, 900]]
+
+    escrow.credit(1, 1800)
+    with SessionLocal() as db:
+        escrow.settle(db)
+        db.commit()
+    escrow.clear()
+    assert balances(1) == [1900]
+
+
+def test_escrow_release_returns_top_ups(players):
+    escrow = RoundEscrow(CHAT)
+    with SessionLocal() as db:
+        escrow.hold(db, {1: 400})
+        db.commit()
+    escrow.confirm()
+    with SessionLocal() as db:
+        escrow.spend(db, 1, 400)
+        db.commit()
+    with SessionLocal() as db:
+        assert escrow.release(db) == [1]
+        db.commit()
+    assert balances(1) == [1000]
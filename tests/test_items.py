@@ -0,0 +1,65 @@
+import json
+
+import pytest
+
+import items
+from items import ITEMS, ItemId, get_item, get_shop_item, on_reload, reload_items
+
+
+@pytest.fixture
+def spec():
+    with open(items.ITEMS_PATH, encoding="utf-8") as f:
+        return json.load(f)
+
+
+@pytest.fixture
+def write(tmp_path):
+    def write(data):
+        path = tmp_path / "items.json"
+        path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+        return str(path)
+
+    yield write
+    reload_items()  # вернуть реестр из настоящего файла
+
+
+def test_registry_loads_aliases():
+    assert get_item("calc") is get_item(ItemId.Calculator) is ITEMS["calculator"]
+    assert get_shop_item("lb") is ITEMS[ItemId.Lootbox]
+    assert get_shop_item("ins") is None
+    assert get_item("nope") is None
+
+
+def test_reload_swaps_in_place_and_runs_hooks(spec, write):
+    calls = []
+    hook = on_reload(lambda: calls.append(ITEMS[ItemId.Advisor].price))
+    try:
+        spec["advisor"]["price"] = 777
+        registry = reload_items(write(spec))
+    finally:
+        items._reload_hooks.remove(hook)
+    assert ITEMS[ItemId.Advisor].price == 777
+    assert get_item("adv") is registry.items["advisor"]
+    assert calls == [777]
+
+
+@pytest.mark.parametrize(
+    "broken",
+    [
+        lambda s: s["advisor"].update(price=True),
+        lambda s: s["advisor"].update(price=-1),
+        lambda s: s["advisor"].update(short="calc"),
+        lambda s: s["lootbox"].update(loot=[["coins", 1, 0, 10]]),
+        lambda s: s["lootbox"].update(loot={"coins": [1, 10]}),
+        lambda s: s["lootbox"].update(loot={"coins": [0, 0, 10], "escape": [0, 1, 1]}),
+        lambda s: s["lootbox"]["loot"].update(gold=[1, 1, 1]),
+        lambda s: s.pop("escape"),
+        lambda s: s.update(escape="🏃"),
+    ],
+)
+def test_broken_file_keeps_registry(spec, write, broken):
+    before = dict(ITEMS)
+    broken(spec)
+    with pytest.raises(ValueError):
+        reload_items(write(spec))
+    assert ITEMS == before
@@ -0,0 +1,117 @@
+import asyncio
+import heapq
+import itertools
+import math
+from typing import Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from actors import Actors
+
+# Таймауты игр: конец ставок, авто-«хватит», рестарт раздачи, выход из
+# паузы, отложенная перерисовка стола, таймаут RPS. Вместо джоб
+# APScheduler — куча дедлайнов прямо на asyncio-цикле и одно пробуждение на
+# ближайший из них. Таймер адресуется парой (чат, вид): новый таймер того же
+# вида заменяет старый, отмена — пометка записи, без перестройки кучи.
+# Сработавший таймер — тик в ящик актора чата, в очередь с его апдейтами.
+
+Callback = Callable[[], Awaitable]
+
+# отменённые записи дочищаем пересборкой, когда их больше половины кучи
+COMPACT_MIN = 256
+
+
+class _Timer:
+    __slots__ = ("deadline", "chat_id", "kind", "callback", "cancelled")
+
+    def __init__(self, deadline: float, chat_id: int, kind: str, callback: Callback):
+        self.deadline = deadline
+        self.chat_id = chat_id
+        self.kind = kind
+        self.callback = callback
+        self.cancelled = False
+
+
+class Timers:
+    def __init__(self, actors: Actors):
+        self.actors = actors
+        self._heap: List[Tuple[float, int, _Timer]] = []
+        self._chats: Dict[int, Dict[str, _Timer]] = {}
+        self._seq = itertools.count()
+        self._wakeup: Optional[asyncio.TimerHandle] = None
+        self._wake_at = math.inf
+        self._dead = 0
+        self._running: Set[asyncio.Task] = set()
+
+    def schedule(
+        self, chat_id: int, kind: str, delay: float, callback: Callback
+    ) -> None:
+        self.cancel(chat_id, kind)
+        loop = asyncio.get_running_loop()
+        timer = _Timer(loop.time() + max(0.0, delay), chat_id, kind, callback)
+        self._chats.setdefault(chat_id, {})[kind] = timer
+        heapq.heappush(self._heap, (timer.deadline, next(self._seq), timer))
+        if timer.deadline < self._wake_at:
+            self._arm(loop)
+
+    def cancel(self, chat_id: int, *kinds: str) -> None:
+        # без kinds — все таймеры чата
+        timers = self._chats.get(chat_id)
+        if not timers:
+            return
+        for kind in kinds or list(timers):
+            timer = timers.pop(kind, None)
+            if timer is not None:
+                timer.cancelled = True
+                self._dead += 1
+        if not timers:
+            del self._chats[chat_id]
+        if self._dead > COMPACT_MIN and self._dead * 2 > len(self._heap):
+            self._heap = [e for e in self._heap if not e[2].cancelled]
+            heapq.heapify(self._heap)
+            self._dead = 0
+
+    def pending(self, chat_id: int, kind: str) -> bool:
+        return kind in self._chats.get(chat_id, ())
+
+    def __len__(self) -> int:
+        return len(self._heap) - self._dead
+
+    def _arm(self, loop: asyncio.AbstractEventLoop) -> None:
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+        self._wake_at = self._heap[0][0]
+        self._wakeup = loop.call_at(self._wake_at, self._fire)
+
+    def _fire(self) -> None:
+        self._wakeup, self._wake_at = None, math.inf
+        loop = asyncio.get_running_loop()
+        heap = self._heap
+        now = loop.time()
+        while heap and (heap[0][2].cancelled or heap[0][0] <= now):
+            _, _, timer = heapq.heappop(heap)
+            if timer.cancelled:
+                self._dead -= 1
+                continue
+            timers = self._chats[timer.chat_id]
+            del timers[timer.kind]
+            if not timers:
+                del self._chats[timer.chat_id]
+            if not self.actors.tell(timer.chat_id, timer.callback):
+                # ящик полон: тик дождётся места, но не потеряется
+                task = asyncio.create_task(
+                    self.actors.send(timer.chat_id, timer.callback)
+                )
+                self._running.add(task)
+                task.add_done_callback(self._running.discard)
+        if heap:
+            self._arm(loop)
+
+    async def stop(self) -> None:
+        if self._wakeup is not None:
+            self._wakeup.cancel()
+        self._wakeup, self._wake_at = None, math.inf
+        self._heap.clear()
+        self._chats.clear()
+        self._dead = 0
+        for task in self._running:
+            task.cancel()
+        await asyncio.gather(*self._running, return_exceptions=True)
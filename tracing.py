@@ -0,0 +1,144 @@
+import asyncio
+import itertools
+import json
+import random
+import sys
+import time
+from collections import deque
+from typing import Any, Dict, Optional
+
+from config import TRACE_BUFFER, TRACE_FILE, TRACE_FLUSH, TRACE_LEVEL, TRACE_SAMPLE
+
+# Трассировка игр вместо print(): событие — кортеж (время, уровень, имя,
+# id игры, поля) в кольцевом буфере, без форматирования на цикле. Раз в
+# TRACE_FLUSH секунд буфер целиком уходит в поток-писатель, который и
+# собирает из него JSON-строки. Не успевает — буфер затирает старое и
+# считает потери.
+#
+# У каждой игры свой id, по нему её события склеиваются в историю. Что
+# пишется: всё от TRACE_LEVEL и выше, но debug/info — только у доли игр
+# TRACE_SAMPLE, выбранной при создании; warning/error — у всех.
+#
+# Поля — только скаляры: словарь уезжает в буфер как есть и сериализуется
+# позже, изменяемый объект к тому времени будет уже другим.
+
+DEBUG, INFO, WARNING, ERROR = 10, 20, 30, 40
+LEVELS = {"debug": DEBUG, "info": INFO, "warning": WARNING, "error": ERROR}
+LEVEL_NAMES = {v: k for k, v in LEVELS.items()}
+
+
+class Trace:
+    __slots__ = ("id", "sampled", "tracer")
+
+    def __init__(self, tracer: "Tracer", trace_id: str, sampled: bool):
+        self.id = trace_id
+        self.sampled = sampled
+        self.tracer = tracer
+
+    def _emit(self, level: int, name: str, fields: Dict[str, Any]) -> None:
+        if level >= self.tracer.level and (self.sampled or level >= WARNING):
+            self.tracer.emit(level, name, self.id, fields)
+
+    def debug(self, name: str, **fields) -> None:
+        self._emit(DEBUG, name, fields)
+
+    def info(self, name: str, **fields) -> None:
+        self._emit(INFO, name, fields)
+
+    def warning(self, name: str, **fields) -> None:
+        self._emit(WARNING, name, fields)
+
+    def error(self, name: str, **fields) -> None:
+        self._emit(ERROR, name, fields)
+
+
+class Tracer:
+    def __init__(
+        self,
+        level: str = TRACE_LEVEL,
+        sample: float = TRACE_SAMPLE,
+        size: int = TRACE_BUFFER,
+        path: str = TRACE_FILE,
+    ):
+        if level.lower() not in LEVELS:
+            raise ValueError(f"TRACE_LEVEL={level!r}: допустимы {', '.join(LEVELS)}")
+        self.level = LEVELS[level.lower()]
+        self.sample = sample
+        self.path = path
+        self.buffer: deque = deque(maxlen=size)
+        self.dropped = 0
+        self._seq = itertools.count(1)
+        self._task: Optional[asyncio.Task] = None
+        self._users = 0
+
+    def trace(self, chat_id: int) -> Trace:
+        return Trace(
+            self, f"{chat_id}:{next(self._seq)}", random.random() < self.sample
+        )
+
+    def emit(self, level: int, name: str, trace_id: str, fields: Dict[str, Any]):
+        buffer = self.buffer
+        if len(buffer) == buffer.maxlen:
+            self.dropped += 1
+        buffer.append((time.time(), level, name, trace_id, fields))
+
+    # --- запись ---
+
+    async def start(self) -> None:
+        # один писатель на процесс, сколько бы ботов его ни запускало
+        self._users += 1
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        self._users -= 1
+        if self._users > 0 or self._task is None:
+            return
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+        await self._flush()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(TRACE_FLUSH)
+            await self._flush()
+
+    async def _flush(self) -> None:
+        if not self.buffer and not self.dropped:
+            return
+        batch, dropped = list(self.buffer), self.dropped
+        self.buffer.clear()
+        self.dropped = 0
+        try:
+            await asyncio.to_thread(self._write, batch, dropped)
+        except Exception as e:
+            print(f"Трассировка: не записали {len(batch)} событий: {e}")
+
+    def _write(self, batch, dropped: int) -> None:
+        lines = [
+            json.dumps(
+                {
+                    "ts": round(ts, 3),
+                    "level": LEVEL_NAMES[level],
+                    "event": name,
+                    "trace": trace_id,
+                    **fields,
+                },
+                ensure_ascii=False,
+                default=str,
+            )
+            for ts, level, name, trace_id, fields in batch
+        ]
+        if dropped:
+            lines.append(json.dumps({"ts": round(time.time(), 3), "dropped": dropped}))
+        text = "\n".join(lines) + "\n"
+        if self.path:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(text)
+        else:
+            sys.stdout.write(text)
+            sys.stdout.flush()
+
+
+TRACER = Tracer()
@@ -0,0 +1,179 @@
+import asyncio
+import importlib.util
+import time
+from dataclasses import dataclass
+
+import httpx
+from telegram.error import TimedOut
+from telegram.request import BaseRequest, HTTPXRequest
+
+from config import (
+    BOT_CONNECT_TIMEOUT,
+    BOT_HTTP_VERSION,
+    BOT_KEEPALIVE,
+    BOT_KEEPALIVE_EXPIRY,
+    BOT_POLL_POOL_SIZE,
+    BOT_POLL_READ_TIMEOUT,
+    BOT_POOL_SIZE,
+    BOT_POOL_TIMEOUT,
+    BOT_READ_TIMEOUT,
+    BOT_WRITE_TIMEOUT,
+)
+
+# Отдельные пулы соединений к Bot API: один под getUpdates (длинный read
+# timeout, пара коннектов), другой под отправку сообщений и правки столов.
+# Очередь на свободный коннект считаем сами — httpx её не показывает.
+
+
+class PoolTimedOut(TimedOut):
+    # запрос так и не ушёл в Telegram, повторять его безопасно
+    def __init__(self, name: str):
+        super().__init__(
+            f"Pool timeout: все соединения пула {name} заняты, запрос не отправлен"
+        )
+
+
+@dataclass
+class PoolMetrics:
+    requests: int = 0
+    in_flight: int = 0
+    peak_in_flight: int = 0
+    waited: int = 0
+    wait_total: float = 0.0
+    wait_max: float = 0.0
+    pool_timeouts: int = 0
+    timeouts: int = 0
+
+    def report(self, name: str, size: int) -> str:
+        avg = self.wait_total / self.waited if self.waited else 0.0
+        return (
+            f"{name}: запросов {self.requests}, пик {self.peak_in_flight}/{size}, "
+            f"ждали коннект {self.waited} (ср {avg * 1000:.0f} мс, "
+            f"макс {self.wait_max * 1000:.0f} мс), pool timeout {self.pool_timeouts}, "
+            f"timeout {self.timeouts}"
+        )
+
+    def reset(self):
+        in_flight = self.in_flight
+        self.__init__()
+        self.in_flight = self.peak_in_flight = in_flight
+
+
+class MeteredRequest(HTTPXRequest):
+    def __init__(
+        self,
+        name: str,
+        pool_size: int,
+        keepalive: int,
+        read_timeout: float,
+        **kwargs,
+    ):
+        self.name = name
+        self.pool_size = pool_size
+        self.metrics = PoolMetrics()
+        self._gate = asyncio.Semaphore(pool_size)
+        self._users = 0
+        super().__init__(
+            connection_pool_size=pool_size,
+            read_timeout=read_timeout,
+            write_timeout=BOT_WRITE_TIMEOUT,
+            connect_timeout=BOT_CONNECT_TIMEOUT,
+            pool_timeout=BOT_POOL_TIMEOUT,
+            http_version=_http_version(),
+            httpx_kwargs={
+                "limits": httpx.Limits(
+                    max_connections=pool_size,
+                    max_keepalive_connections=min(keepalive, pool_size),
+                    keepalive_expiry=BOT_KEEPALIVE_EXPIRY,
+                )
+            },
+            **kwargs,
+        )
+
+    # один пул может делить несколько ботов процесса: закрываем его,
+    # когда остановился последний
+    async def initialize(self) -> None:
+        self._users += 1
+        await super().initialize()
+
+    async def shutdown(self) -> None:
+        self._users = max(0, self._users - 1)
+        if not self._users:
+            await super().shutdown()
+
+    async def do_request(
+        self,
+        url: str,
+        method: str,
+        request_data=None,
+        read_timeout=BaseRequest.DEFAULT_NONE,
+        write_timeout=BaseRequest.DEFAULT_NONE,
+        connect_timeout=BaseRequest.DEFAULT_NONE,
+        pool_timeout=BaseRequest.DEFAULT_NONE,
+    ):
+        m = self.metrics
+        if not isinstance(pool_timeout, (int, float, type(None))):
+            pool_timeout = BOT_POOL_TIMEOUT
+
+        started = time.monotonic()
+        if self._gate.locked():
+            m.waited += 1
+            try:
+                await asyncio.wait_for(self._gate.acquire(), pool_timeout)
+            except asyncio.TimeoutError:
+                m.pool_timeouts += 1
+                raise PoolTimedOut(self.name) from None
+            waited = time.monotonic() - started
+            m.wait_total += waited
+            m.wait_max = max(m.wait_max, waited)
+        else:
+            await self._gate.acquire()
+
+        m.requests += 1
+        m.in_flight += 1
+        m.peak_in_flight = max(m.peak_in_flight, m.in_flight)
+        try:
+            return await super().do_request(
+                url,
+                method,
+                request_data=request_data,
+                read_timeout=read_timeout,
+                write_timeout=write_timeout,
+                connect_timeout=connect_timeout,
+                pool_timeout=pool_timeout,
+            )
+        except TimedOut:
+            m.timeouts += 1
+            raise
+        finally:
+            m.in_flight -= 1
+            self._gate.release()
+
+
+def _http_version() -> str:
+    if BOT_HTTP_VERSION.startswith("2") and importlib.util.find_spec("h2") is None:
+        print("HTTP/2 недоступен без пакета h2, используем HTTP/1.1")
+        return "1.1"
+    return BOT_HTTP_VERSION
+
+
+def make_send_request() -> MeteredRequest:
+    return MeteredRequest(
+        "send", BOT_POOL_SIZE, BOT_KEEPALIVE, read_timeout=BOT_READ_TIMEOUT
+    )
+
+
+def make_poll_request(bots: int = 1) -> MeteredRequest:
+    # каждый бот процесса держит свой long poll
+    return MeteredRequest(
+        "poll",
+        BOT_POLL_POOL_SIZE * bots,
+        BOT_POLL_POOL_SIZE * bots,
+        read_timeout=BOT_POLL_READ_TIMEOUT,
+    )
+
+
+async def log_request_metrics(context):
+    for request in context.job.data:
+        print(request.metrics.report(request.name, request.pool_size))
+        request.metrics.reset()
@@ -0,0 +1,200 @@
+import asyncio
+import hmac
+import json
+import ssl
+from contextlib import AsyncExitStack
+from typing import Awaitable, Callable, Dict, Optional
+
+from telegram import Update
+
+from runner import running, wait_for_stop_signal
+
+from config import (
+    WEBHOOK_CERT,
+    WEBHOOK_KEY,
+    WEBHOOK_LISTEN,
+    WEBHOOK_MAX_CONNECTIONS,
+    WEBHOOK_PATH,
+    WEBHOOK_PORT,
+    WEBHOOK_SECRET,
+    WEBHOOK_URL,
+)
+
+# Минимальный HTTP/1.1 сервер под вебхуки Telegram: принимает POST с JSON
+# апдейта, проверяет секрет и сразу отвечает 200 — обработка идёт уже из
+# очереди. TLS обычно снимает прокси перед ботом, но можно отдать серт сюда.
+
+MAX_BODY = 1 << 20
+HEADER_TIMEOUT = 30
+SECRET_HEADER = "x-telegram-bot-api-secret-token"
+
+REASONS = {
+    200: "OK",
+    400: "Bad Request",
+    403: "Forbidden",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+}
+
+
+class WebhookServer:
+    def __init__(
+        self,
+        routes: Dict[str, Callable[[dict], Awaitable[None]]],
+        listen: str = WEBHOOK_LISTEN,
+        port: int = WEBHOOK_PORT,
+        secret: str = WEBHOOK_SECRET,
+        max_connections: int = WEBHOOK_MAX_CONNECTIONS,
+        ssl_ctx: Optional[ssl.SSLContext] = None,
+    ):
+        # путь -> обработчик: у каждого бота процесса свой путь
+        self.routes = routes
+        self.listen = listen
+        self.port = port
+        self.secret = secret
+        self.ssl_ctx = ssl_ctx
+        self._slots = asyncio.Semaphore(max_connections)
+        self._server: Optional[asyncio.base_events.Server] = None
+        self._conns = set()
+
+    async def start(self):
+        self._server = await asyncio.start_server(
+            self._handle, self.listen, self.port, ssl=self.ssl_ctx
+        )
+        scheme = "https" if self.ssl_ctx else "http"
+        for path in self.routes:
+            print(f"Webhook: слушаю {scheme}://{self.listen}:{self.port}{path}")
+
+    async def stop(self):
+        if self._server:
+            self._server.close()
+            # keep-alive соединения Telegram сами не закроются
+            for reader, writer in list(self._conns):
+                reader.feed_eof()
+                writer.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        async with self._slots:
+            self._conns.add((reader, writer))
+            try:
+                while await self._serve_one(reader, writer):
+                    pass
+            except (
+                asyncio.IncompleteReadError,
+                asyncio.LimitOverrunError,
+                asyncio.TimeoutError,
+                ConnectionError,
+                ValueError,
+            ):
+                pass
+            finally:
+                self._conns.discard((reader, writer))
+                writer.close()
+
+    async def _serve_one(self, reader, writer) -> bool:
+        head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), HEADER_TIMEOUT)
+        request_line, *header_lines = head.decode("latin-1").split("\r\n")
+        method, target, version = request_line.split(" ", 2)
+        headers: Dict[str, str] = {}
+        for line in header_lines:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                headers[name.strip().lower()] = value.strip()
+
+        keep_alive = headers.get("connection", "").lower() != "close" and (
+            version == "HTTP/1.1"
+        )
+        length = int(headers.get("content-length", "0") or 0)
+        if length > MAX_BODY:
+            await self._respond(writer, 413, keep_alive=False)
+            return False
+        body = await reader.readexactly(length) if length else b""
+
+        status = await self._dispatch(method, target, headers, body)
+        await self._respond(writer, status, keep_alive)
+        return keep_alive
+
+    async def _dispatch(self, method, target, headers, body) -> int:
+        on_update = self.routes.get(target.split("?", 1)[0])
+        if on_update is None:
+            return 404
+        if method != "POST":
+            return 405
+        if self.secret and not hmac.compare_digest(
+            headers.get(SECRET_HEADER, ""), self.secret
+        ):
+            return 403
+        try:
+            data = json.loads(body)
+        except ValueError:
+            return 400
+        if not isinstance(data, dict) or "update_id" not in data:
+            return 400
+        await on_update(data)
+        return 200
+
+    @staticmethod
+    async def _respond(writer, status: int, keep_alive: bool):
+        writer.write(
+            (
+                f"HTTP/1.1 {status} {REASONS[status]}\r\n"
+                "Content-Length: 0\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+                "\r\n"
+            ).encode("latin-1")
+        )
+        await writer.drain()
+
+
+def ssl_context() -> Optional[ssl.SSLContext]:
+    if not (WEBHOOK_CERT and WEBHOOK_KEY):
+        return None
+    ctx = ssl.create_default_context(ssl.Purpose.CLIENT_AUTH)
+    ctx.load_cert_chain(WEBHOOK_CERT, WEBHOOK_KEY)
+    return ctx
+
+
+def webhook_suffix(ns: str) -> str:
+    return f"/{ns}" if ns else ""
+
+
+async def register_webhook(bot, suffix: str = ""):
+    # без WEBHOOK_URL сервер работает только локально (например, для тестов
+    # записанными апдейтами через curl), в Telegram ничего не регистрируем
+    if not WEBHOOK_URL:
+        print("Webhook: WEBHOOK_URL не задан, setWebhook пропущен")
+        return
+    await bot.set_webhook(
+        url=WEBHOOK_URL + suffix,
+        secret_token=WEBHOOK_SECRET or None,
+        max_connections=WEBHOOK_MAX_CONNECTIONS,
+        allowed_updates=Update.ALL_TYPES,
+    )
+
+
+def _feeder(app):
+    async def feed(data: dict):
+        await app.update_queue.put(Update.de_json(data, app.bot))
+
+    return feed
+
+
+async def run_webhook(apps):
+    # один сервер на все боты процесса, бот определяется по пути
+    suffixes = [webhook_suffix(app.update_processor.ns) for app in apps]
+    routes = {WEBHOOK_PATH + sfx: _feeder(app) for app, sfx in zip(apps, suffixes)}
+    server = WebhookServer(routes, ssl_ctx=ssl_context())
+
+    async with AsyncExitStack() as stack:
+        for app in apps:
+            await stack.enter_async_context(running(app))
+        await server.start()
+        for app, sfx in zip(apps, suffixes):
+            await register_webhook(app.bot, sfx)
+        try:
+            await wait_for_stop_signal()
+        finally:
+            await server.stop()
@@ -124,12 +124,26 @@ ESCAPE_DESC = f"""
 — На баланс возвращается половина текущей ставки (округляется до целого).
 """
 
+ADVISOR_DESC = f"""
+{ITEMS[ItemId.Advisor].name} <{ITEMS[ItemId.Advisor].id_short_name}>
+
+Что это
+Постоянный предмет: за столом в блэкджеке отмечает «🧭» кнопку самого выгодного хода для твоей руки.
+
+Как работает
+— Нужен предмет «{ITEMS[ItemId.Advisor].name}» в инвентаре, не расходуется.  
+— Считает матожидание каждого доступного хода: взять, хватит, удвоить, разделить, побег.  
+— Учитывает открытую карту дилера и все карты на столе: чего уже нет, того и не выпадет.  
+— Это лучший ход в среднем, а не гарантия выигрыша раздачи.
+"""
+
 ALIAS_BJ = (HandlerBlackJack.long, HandlerBlackJack.short)
 ALIAS_DOUBLE = ("double",)
 ALIAS_SPLIT = ("split",)
 ALIAS_INSURANCE = (ITEMS[ItemId.Insurance].id, ITEMS[ItemId.Insurance].id_short_name)
 ALIAS_HOTCARD = (ITEMS[ItemId.HotCard].id, ITEMS[ItemId.HotCard].id_short_name)
 ALIAS_ESCAPE = (ITEMS[ItemId.Escape].id, ITEMS[ItemId.Escape].id_short_name)
+ALIAS_ADVISOR = (ITEMS[ItemId.Advisor].id, ITEMS[ItemId.Advisor].id_short_name)
 
 WIKI_DATA: Dict[Tuple[str, ...], str] = {
     ALIAS_BJ: BLACK_JACK_RULES,
@@ -138,6 +152,7 @@ WIKI_DATA: Dict[Tuple[str, ...], str] = {
     ALIAS_INSURANCE: INSURANCE_DESC,
     ALIAS_HOTCARD: HOTCARD_DESC,
     ALIAS_ESCAPE: ESCAPE_DESC,
+    ALIAS_ADVISOR: ADVISOR_DESC,
 }
 
 